@@ -0,0 +1,211 @@
+# an in-process stand in for the parts of discord.py the bot uses, with simulated REST latency
+import asyncio
+import itertools
+import random
+from collections import Counter
+
+import discord
+
+
+class FakeREST:
+    def __init__(self, latency=0.0, jitter=0.0, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.rng = random.Random(seed)
+        self.calls = Counter()
+
+    async def call(self, endpoint):
+        self.calls[endpoint] += 1
+
+        delay = self.latency + (self.rng.uniform(0, self.jitter) if self.jitter else 0)
+        await asyncio.sleep(delay)
+
+
+class FakeSentMessage:
+    def __init__(self, gateway, channel, content, embed):
+        self.gateway = gateway
+        self.id = gateway.nextID()
+        self.channel = channel
+        self.content = content
+        self.embed = embed
+
+    @property
+    def jump_url(self):
+        guild = self.channel.guild.id if self.channel.guild else "@me"
+        return "https://discord.com/channels/{}/{}/{}".format(
+            guild, self.channel.id, self.id
+        )
+
+    async def edit(self, content=None, embed=None):
+        await self.gateway.rest.call("edit_message")
+        self.content = content if content is not None else self.content
+        self.embed = embed if embed is not None else self.embed
+
+    async def delete(self):
+        await self.gateway.rest.call("delete_message")
+
+    async def pin(self):
+        await self.gateway.rest.call("pin_message")
+
+    async def unpin(self):
+        await self.gateway.rest.call("unpin_message")
+
+
+class FakeChannel:
+    def __init__(self, gateway, name, guild=None):
+        self.gateway = gateway
+        self.id = gateway.nextID()
+        self.name = name
+        self.guild = guild
+        self.mention = "<#{}>".format(self.id)
+        self.sent = 0
+        gateway.channels[self.id] = self
+
+    async def send(self, content=None, embed=None):
+        await self.gateway.rest.call("send_message")
+        self.sent += 1
+        return FakeSentMessage(self.gateway, self, content, embed)
+
+    async def fetch_message(self, id):
+        await self.gateway.rest.call("fetch_message")
+        return FakeSentMessage(self.gateway, self, None, None)
+
+    def permissions_for(self, member):
+        return discord.Permissions.all()
+
+    def __eq__(self, other):
+        return isinstance(other, FakeChannel) and other.id == self.id
+
+    def __hash__(self):
+        return self.id
+
+
+class FakeDMChannel(FakeChannel):
+    pass
+
+
+class FakeTextChannel(FakeChannel):
+    def __init__(self, gateway, name, guild, category=None, overwrites=None):
+        super().__init__(gateway, name, guild)
+        self.category = category
+        self.category_id = category.id if category else None
+        self.overwrites = dict(overwrites or {})
+
+    async def set_permissions(self, target, overwrite=None):
+        await self.gateway.rest.call("set_permissions")
+        self.overwrites[target] = overwrite
+
+    async def edit(self, overwrites=None, **options):
+        await self.gateway.rest.call("edit_channel")
+
+        if overwrites is not None:
+            self.overwrites = dict(overwrites)
+
+    async def purge(self, limit=None):
+        await self.gateway.rest.call("purge")
+        return []
+
+    async def delete(self):
+        await self.gateway.rest.call("delete_channel")
+        self.gateway.channels.pop(self.id, None)
+
+
+class FakeCategory(FakeChannel):
+    async def create_text_channel(self, name, overwrites=None):
+        await self.gateway.rest.call("create_channel")
+        return FakeTextChannel(self.gateway, name, self.guild, self, overwrites)
+
+
+class FakeRole:
+    def __init__(self, gateway, name):
+        self.id = gateway.nextID()
+        self.name = name
+        self.mention = "<@&{}>".format(self.id)
+
+
+class FakeMember:
+    def __init__(self, gateway, name, guild):
+        self.gateway = gateway
+        self.id = gateway.nextID()
+        self.name = name
+        self.display_name = name
+        self.mention = "<@{}>".format(self.id)
+        self.guild = guild
+        self.roles = []
+        self.bot = False
+        self.guild_permissions = discord.Permissions.none()
+        self.dm = FakeDMChannel(gateway, "dm-{}".format(name))
+
+    async def send(self, content=None, embed=None):
+        return await self.dm.send(content, embed=embed)
+
+    def __eq__(self, other):
+        return getattr(other, "id", None) == self.id
+
+    def __hash__(self):
+        return self.id
+
+
+class FakeGuild:
+    def __init__(self, gateway, name):
+        self.gateway = gateway
+        self.id = gateway.nextID()
+        self.name = name
+        self.members = {}
+        self.default_role = FakeRole(gateway, "@everyone")
+        self.me = self.addMember("MafiaBot")
+        self.owner = self.addMember("owner")
+        self.me.guild_permissions = discord.Permissions.all()
+        self.owner.guild_permissions = discord.Permissions.all()
+
+    def addMember(self, name):
+        member = FakeMember(self.gateway, name, self)
+        self.members[member.id] = member
+        return member
+
+    def get_member(self, id):
+        return self.members.get(id)
+
+
+class FakeIncomingMessage:
+    def __init__(self, author, channel, content, mentions=()):
+        self.id = author.gateway.nextID()
+        self.author = author
+        self.channel = channel
+        self.guild = channel.guild if isinstance(channel, FakeTextChannel) else None
+        self.content = content
+        self.mentions = list(mentions)
+        self.role_mentions = []
+        self.channel_mentions = []
+
+
+class FakeGateway:
+    def __init__(self, latency=0.0, jitter=0.0, seed=None):
+        self.ids = itertools.count(1 << 40)
+        self.rest = FakeREST(latency, jitter, seed)
+        self.channels = {}
+        self.guilds = []
+
+    def nextID(self):
+        return next(self.ids)
+
+    def addGuild(self, name):
+        guild = FakeGuild(self, name)
+        self.guilds.append(guild)
+        return guild
+
+    def addCategory(self, guild, name):
+        return FakeCategory(self, name, guild)
+
+    def addTextChannel(self, guild, name, category):
+        return FakeTextChannel(self, name, guild, category)
+
+    def message(self, author, channel, content, mentions=()):
+        return FakeIncomingMessage(author, channel, content, mentions)
+
+
+def install():
+    # the bot checks channel types against discord's classes, so point them at the fakes
+    discord.DMChannel = FakeDMChannel
+    discord.TextChannel = FakeTextChannel
+    discord.abc.User.register(FakeMember)
@@ -0,0 +1,234 @@
+# drives thousands of scripted games through the bot against the fake gateway and reports how it copes
+#   python3 -m benchmarks.load --games 2000 --concurrency 500 --latency 50
+import argparse
+import asyncio
+import gc
+import os
+import random
+import statistics
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.fakediscord import FakeGateway, install
+
+install()
+
+from mafia import Mafia
+from mafia.engine import Role, State
+
+
+class LoadBot(Mafia):
+    legacyPersist = None
+
+    def __init__(self, gateway, persist):
+        self.gateway = gateway
+        self.persist = persist
+        self.gameLogDirectory = os.path.join(os.path.dirname(persist), "games")
+        super().__init__()
+
+    @property
+    def guilds(self):
+        return self.gateway.guilds
+
+    def get_channel(self, id):
+        return self.gateway.channels.get(id)
+
+    async def change_presence(self, **options):
+        await self.gateway.rest.call("change_presence")
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = []
+
+    async def say(self, bot, gateway, author, channel, content, mentions=(), game=None):
+        # timed until the game has handled the message and sent everything it caused
+        message = gateway.message(author, channel, content, mentions)
+        started = time.perf_counter()
+        await bot.on_message(message)
+
+        if game is not None:
+            await game.idle()
+
+        self.latencies.append(time.perf_counter() - started)
+
+    def percentile(self, p):
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * p))]
+
+
+def makeTable(gateway, bot, games, perGuild):
+    # one guild per perGuild games, each game in its own active channel
+    tables = []
+
+    for n in range(games):
+        if n % perGuild == 0:
+            guild = gateway.addGuild("guild-{}".format(n // perGuild))
+            category = gateway.addCategory(guild, "games")
+            bot.generateSettings(guild.id)
+
+        channel = gateway.addTextChannel(guild, "mafia-{}".format(n), category)
+        bot.settings[guild.id]["activeChannels"].append(channel.id)
+        tables.append((guild, channel))
+
+    return tables
+
+
+async def playGame(bot, gateway, recorder, guild, channel, players, rng):
+    members = [guild.addMember("p{}-{}".format(channel.id, n)) for n in range(players)]
+    byID = {m.id: m for m in members}
+
+    await recorder.say(bot, gateway, members[0], channel, "!mafia")
+    game = bot.active[channel.id]["game"]
+    engine = game.engine
+    say = lambda *a, **k: recorder.say(bot, gateway, *a, game=game, **k)
+
+    for m in members:
+        await say(m, channel, "!join")
+    await say(members[0], channel, "!start")
+
+    for _ in range(players * 4):
+        if engine.state == State.ROUNDSLEEP:
+            targets = [
+                n + 1
+                for n, p in enumerate(engine.players)
+                if engine.roleOf(p) != Role.MAFIA
+            ]
+            target = rng.choice(targets)
+
+            for m in list(engine.mafia):
+                await say(byID[m], game.mafiaChannel, "!choose {}".format(target))
+
+            for p in [engine.doctor, engine.detective]:
+                if p is not None and engine.state == State.ROUNDSLEEP:
+                    choice = rng.choice(
+                        [
+                            n + 1
+                            for n, q in enumerate(engine.players)
+                            if q != engine.lastRoundSave
+                        ]
+                    )
+                    await say(byID[p], byID[p].dm, "!choose {}".format(choice))
+
+            await say(members[0], channel, "!why")
+
+        elif engine.state == State.ROUNDPURGE:
+            for p in list(engine.players):
+                if engine.state != State.ROUNDPURGE:
+                    break
+
+                if rng.random() < 0.2:
+                    await say(byID[p], channel, "!skip")
+                else:
+                    target = byID[rng.choice(engine.players)]
+                    await say(byID[p], channel, "!accuse", [target])
+
+        else:
+            break
+
+    await say(members[0], channel, "!destroy")
+
+
+async def measureMemory(gateway, bot, recorder, games, players):
+    # memory held per game lobby, from the bot's maps down to the engine
+    tables = makeTable(gateway, bot, games, 50)
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+
+    for guild, channel in tables:
+        members = [
+            guild.addMember("m{}-{}".format(channel.id, n)) for n in range(players)
+        ]
+        await recorder.say(bot, gateway, members[0], channel, "!mafia")
+        game = bot.active[channel.id]["game"]
+
+        for m in members:
+            await recorder.say(bot, gateway, m, channel, "!join", game=game)
+
+    gc.collect()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+
+    used = sum(s.size_diff for s in after.compare_to(before, "filename"))
+    return used / games
+
+
+async def main(options):
+    gateway = FakeGateway(options.latency / 1000, options.jitter / 1000, options.seed)
+    persist = os.path.join(options.directory, "load.db")
+    bot = LoadBot(gateway, persist)
+    bot.settings["bot"]["prefix"] = "%%"
+    rng = random.Random(options.seed)
+    recorder = Recorder()
+
+    tables = makeTable(gateway, bot, options.games, options.per_guild)
+    limit = asyncio.Semaphore(options.concurrency)
+
+    async def run(guild, channel):
+        async with limit:
+            await playGame(bot, gateway, recorder, guild, channel, options.players, rng)
+
+    started = time.perf_counter()
+    await asyncio.gather(*[run(guild, channel) for guild, channel in tables])
+    elapsed = time.perf_counter() - started
+    await bot.gameLog.flush(bot.loop)
+
+    memory = await measureMemory(
+        FakeGateway(),
+        LoadBot(FakeGateway(), persist + ".memory"),
+        Recorder(),
+        200,
+        options.players,
+    )
+
+    print(
+        "{} games of {} players, {} at a time, {}ms REST latency".format(
+            options.games, options.players, options.concurrency, options.latency
+        )
+    )
+    print(
+        "{} messages in {:.2f}s - {:.0f} messages/s, {:.0f} REST calls/s".format(
+            len(recorder.latencies),
+            elapsed,
+            len(recorder.latencies) / elapsed,
+            sum(gateway.rest.calls.values()) / elapsed,
+        )
+    )
+    print(
+        "message handling latency: p50 {:.1f}ms, p90 {:.1f}ms, p99 {:.1f}ms, max {:.1f}ms, mean {:.1f}ms".format(
+            recorder.percentile(0.5) * 1000,
+            recorder.percentile(0.9) * 1000,
+            recorder.percentile(0.99) * 1000,
+            max(recorder.latencies) * 1000,
+            statistics.mean(recorder.latencies) * 1000,
+        )
+    )
+    print("memory per game lobby: {:.1f}KiB".format(memory / 1024))
+    print("exceptions raised: {}".format(sum(bot.exceptions.seen.values())))
+    print(
+        "REST calls: {}".format(
+            ", ".join("{} {}".format(k, v) for k, v in gateway.rest.calls.most_common())
+        )
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Load test MafiaBot against a fake gateway"
+    )
+    parser.add_argument("--games", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=250)
+    parser.add_argument("--players", type=int, default=8)
+    parser.add_argument("--per-guild", type=int, default=20, help="games per guild")
+    parser.add_argument("--latency", type=float, default=0, help="REST latency in ms")
+    parser.add_argument(
+        "--jitter", type=float, default=0, help="extra random REST latency in ms"
+    )
+    parser.add_argument("--seed", type=int, default=None)
+
+    options = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as options.directory:
+        asyncio.run(main(options))
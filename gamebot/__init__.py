@@ -1,35 +1,99 @@
+import asyncio
 import os.path
-import pickle
 import logging
-import traceback
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 
 import discord
 
 from credentials import ownerID
 from gamebot.decorators import guard
-from gamebot.helpers import (hasPrefix, userInActiveGame, isDM, parseMessage, Colours)
+from gamebot.exceptions import ExceptionSink
+from gamebot.gamelog import GameLog
+from gamebot.helpers import (userInActiveGame, isDM, parseCommand, Colours)
+from gamebot.logs import (logs, RotatingHandler, context, setLevels)
+from gamebot.metrics import (Metrics, RateLimitCounter)
+from gamebot.onboarding import Onboarding
+from gamebot.permissions import PermissionCache
+from gamebot.players import (PlayerIndex, ForwardedMessage)
+from gamebot.profiler import Profiler
+from gamebot.presence import PresenceScheduler
+from gamebot.router import Router
+from gamebot.settings import (Settings, SQLiteStore, PickleStore, migrate)
+from gamebot.snapshots import Snapshots
+from gamebot.timers import Timers
 from mafia.game import (Game, commands)
 
 logger = logging.getLogger('discord')
-logger.setLevel(logging.INFO)
-handler = logging.FileHandler(filename='discord.log', encoding='utf-8', mode='w')
-handler.setFormatter(logging.Formatter('%(asctime)s:%(levelname)s:%(name)s: %(message)s'))
-logger.addHandler(handler)
 
-class GameBot(discord.Client) :
+class GameBot(discord.AutoShardedClient) :
 
     enabled = True
-    settings = {}
+
+    # settings backend, the old whole-file pickle (legacyPersist) is migrated into it on first run
+    settingsStore = SQLiteStore
+    legacyPersist = None
+    settingsCacheSize = 1024
+    flushInterval = 5
+    compactInterval = 6 * 60 * 60
+
+    # every game's actions and events are logged here as JSON lines (see replay.py), None turns the logs off
+    gameLogDirectory = "games"
+
+    # presence is updated at most once per window, optionally including the number of running games
+    presenceWindow = 60
+    presenceShowGames = True
+
+    # each process (cluster) publishes its counts to the settings store this often, for %%stats across processes
+    statsInterval = 30
+
+    # Discord sends every DM to shard 0, so a cluster passes DMs from players in another cluster's game on to it through
+    # the settings store - each cluster picks them up this often, and drops any older than forwardExpiry
+    forwardInterval = 1
+    forwardExpiry = 60
+
+    # exceptions are collected and posted to the log channel as a digest this often
+    exceptionInterval = 60
+
+    # the game phases settings timeout can be set for
+    timeoutPhases = ()
+
+    # discord.py's and the bot's own logs go to logFile as JSON lines, rotated daily or at 10MB, written off the event
+    # loop - full exception traces go to exceptionFile
+    # every cluster after the first has its own files (e.g. discord-1.log), processes can't safely share one to rotate
+    logFile = "discord.log"
+    exceptionFile = "exceptions.log"
+
+    # level per subsystem (logger), %%loglevel overrides them - discord.http needs WARNING or lower for the
+    # rate limit metrics to see 429s
+    logLevels = {
+        "discord"         : "INFO",
+        "discord.gateway" : "INFO",
+        "discord.http"    : "WARNING",
+        "gamebot"         : "INFO"
+    }
+
+    # metrics are served for Prometheus at http://metricsHost:port/metrics, the port goes up by one per cluster
+    # None turns the endpoint off
+    metricsHost = "127.0.0.1"
+    metricsPort = 9464
+
+    # %%profile samples the event loop for at most this many seconds, and writes the collapsed stacks here
+    profileLimit = 300
+    profileDirectory = "profiles"
 
     globalHandlers = {
         # Bot Owner
         "help"     : "cBotHelp",
         "stats"    : "cBotStats",
+        "profile"  : "cBotProfile",
         "leave"    : "cBotLeave",
         "stop"     : "cBotStop",
         "reload"   : "cBotReload",
         "settings" : "cBotSettings",
         "logset"   : "cBotLogSet",
+        "loglevel" : "cBotLogLevel",
 
         "exception"   : "cBotTestException",
         "permissions" : "cBotTestPermissions"
@@ -48,15 +112,39 @@ class GameBot(discord.Client) :
         "remove"     : "cGuildRemove"
     }
 
-    active = {}
-
-    def __init__(self) :
-        super().__init__()
-        if os.path.isfile(self.persist) :
-            with open(self.persist, 'rb') as f :
-                self.settings = pickle.load(f)
-
-        else :
+    def __init__(self, cluster=0, **options) :
+        # options are passed on to AutoShardedClient, e.g. shard_ids and shard_count when running one process per cluster
+        super().__init__(**options)
+        self.cluster = cluster
+
+        if 'discord' not in logs.routes :
+            logs.attach(['discord', 'gamebot'], RotatingHandler(self.clusterFile(self.logFile)))
+
+        self.active = {}
+
+        self.router = self.compileRouter()
+        self.settings = Settings(self.openSettingsStore(), self.settingsCacheSize)
+        self.snapshots = Snapshots(self.settings.store)
+        self.playerGames = PlayerIndex(self.settings.store, cluster, shared=self.shard_ids is not None) # user ID -> channel ID of the active game they're in
+        self.storeExecutor = ThreadPoolExecutor(1) # every write to the settings store, off the event loop and in order
+        self.gameLog = GameLog(self.gameLogDirectory)
+        self.rehydrated = False
+        self.settingsTask = None
+        self.statsTask = None
+        self.forwardTask = None
+        self.onboarding = Onboarding(self)
+        self.presence = PresenceScheduler(self, self.presenceWindow)
+        self.exceptions = ExceptionSink(self, self.exceptionInterval, self.clusterFile(self.exceptionFile))
+        self.timers = Timers(self.loop, self.logException)
+        self.permissionCache = PermissionCache()
+        self.metrics = self.defineMetrics()
+        self.profiler = Profiler(self.loop)
+        self.profileTask = None
+        self.rateLimits = RateLimitCounter(self.metrics["discord_rate_limits_total"])
+        self.http.request = self.timeRequests(self.http.request)
+        logging.getLogger("discord.http").addFilter(self.rateLimits)
+
+        if "bot" not in self.settings :
             # first run
             self.settings["bot"] = {
                 "prefix" : "%%",
@@ -64,14 +152,156 @@ class GameBot(discord.Client) :
                 "manage" : []
             }
 
+        setLevels({ **self.logLevels, **self.settings["bot"].get("logLevels", {}) })
+
     async def close(self) :
+        # games are only suspended, they're restored from their snapshots when the bot comes back
         for game in self.active :
-            await self.active[game]["game"].destroy()
-
-        self.saveSettings()
+            self.active[game]["game"].suspend()
+
+        self.timers.stop()
+        await self.reclaim()
+
+        for task in (self.settingsTask, self.statsTask, self.forwardTask, self.profileTask) :
+            if task :
+                task.cancel()
+
+        self.onboarding.stop()
+        self.presence.stop()
+        self.metrics.stop()
+        logging.getLogger("discord.http").removeFilter(self.rateLimits)
+        self.exceptions.stop()
+        await self.exceptions.flush()
+
+        self.storeExecutor.shutdown()
+        self.snapshots.flush()
+        self.playerGames.flush()
+        self.settings.close()
+        await self.gameLog.flush(self.loop)
+        self.gameLog.stop()
         await super().close()
 
+    async def reclaim(self) :
+        # release any resources held outside of games before disconnecting
+        pass
+
+    async def closeGame(self, channelID, reason=None) :
+        if channelID in self.active :
+            game = self.active.pop(channelID)["game"]
+            await game.destroy()
+
+            if reason :
+                await game.channel.send(reason)
+
+            self.updatePresenceCount()
+
+    async def rehydrate(self) :
+        # carry on the games that were running when the bot last stopped, then tidy up whatever the rest left behind
+        if self.playerGames.shared :
+            # restored games list their players again
+            await self.loop.run_in_executor(self.storeExecutor, self.settings.store.clearPlayers, self.cluster)
+
+        for key, snapshot in self.snapshots.load().items() :
+            guild = self.get_guild(snapshot["guild"])
+
+            if guild is None or key in self.active :
+                # another cluster's guild, or already running
+                continue
+
+            channel = guild.get_channel(key)
+            game = None
+
+            if channel is not None and self.settings.known(guild.id) :
+                try :
+                    game = self.restoreGame(channel, snapshot)
+                except Exception as e :
+                    self.logException(e)
+
+            if game is None :
+                self.snapshots.delete(key)
+                continue
+
+            self.active[key] = { "guild" : guild.id, "game" : game }
+
+        await self.reconcile()
+        self.updatePresenceCount()
+        logger.info("Restored {} games".format(len(self.active)))
+
+    def restoreGame(self, channel, snapshot) :
+        # overridden by the game, returns the game carried on from the snapshot or None if it can't be
+        return None
+
+    async def reconcile(self) :
+        # overridden by the game to clean up after games that weren't restored
+        pass
+
     # Helpers
+    def defineMetrics(self) :
+        metrics = Metrics(self.name.lower())
+
+        metrics.histogram("message_seconds", "Time taken to handle a message", ["kind"])
+        metrics.histogram("handler_seconds", "Time taken by each command handler", ["scope", "command"])
+        metrics.histogram("discord_request_seconds", "Time taken by Discord REST calls, including rate limit waits", ["method", "path"])
+        metrics.counter("discord_rate_limits_total", "Discord REST calls that were rate limited", ["scope"])
+        metrics.gauge("games", "Running games by state", ["state"], self.gamesByState)
+        metrics.gauge("players", "Players in running games", collect=lambda : { () : len(self.playerGames) })
+        metrics.gauge("guilds", "Guilds the bot is in", collect=lambda : { () : len(self.guilds) })
+        metrics.gauge("onboarding_pending", "Guild intros waiting to be sent, including any backing off to retry", collect=lambda : { () : len(self.onboarding.pending) })
+        metrics.gauge("onboarding_completed", "Guild intros finished since startup, by outcome", ["outcome"], self.onboardingCompleted)
+        metrics.histogram("game_players", "Players at the start of each game", buckets=range(1, 21))
+        metrics.histogram("game_seconds", "How long games last from starting to ending", buckets=(60, 300, 600, 900, 1200, 1800, 2700, 3600, 7200))
+
+        return metrics
+
+    def onboardingCompleted(self) :
+        return { (outcome,) : self.onboarding.stats[outcome] for outcome in ("sent", "failed") }
+
+    def gamesByState(self) :
+        states = Counter(getattr(active["game"].state, "name", "unknown") for active in self.active.values())
+        return { (state,) : count for state, count in states.items() }
+
+    def timeRequests(self, request) :
+        # every REST call goes through HTTPClient.request
+        histogram = self.metrics["discord_request_seconds"]
+
+        async def timed(route, **kwargs) :
+            started = time.perf_counter()
+
+            try :
+                return await request(route, **kwargs)
+            finally :
+                histogram.observe(time.perf_counter() - started, route.method, route.path)
+
+        return timed
+
+    async def dispatch(self, scope, command, handle, message, args) :
+        started = time.perf_counter()
+
+        try :
+            await handle(message, args)
+        finally :
+            self.metrics["handler_seconds"].observe(time.perf_counter() - started, scope, command)
+
+    def openSettingsStore(self) :
+        store = self.settingsStore(self.persist)
+
+        if self.legacyPersist and os.path.isfile(self.legacyPersist) and not store.has("bot") :
+            migrate(PickleStore(self.legacyPersist), store)
+
+        return store
+
+    def compileRouter(self) :
+        # resolve every handler to its bound method once, guild commands take precedence over game commands
+        tables = {
+            "bot"   : self.globalHandlers,
+            "guild" : { **self.handlers, **self.guildHandlers }
+        }
+
+        return Router.compile({
+            scope : { command : getattr(self, handler) for command, handler in handlers.items() if handler }
+            for scope, handlers in tables.items()
+        })
+
     def generateSettings(self, gID) :
 
         self.settings[gID] = {
@@ -80,27 +310,78 @@ class GameBot(discord.Client) :
             "manageRoles"       : [ ],
             "activeChannels"    : [ ],
             "winCommand"        : None,
+            "timeouts"          : { },
             "disabled"          : False
         }
 
-    def saveSettings(self) :
-        with open(self.persist, 'wb') as f :
-            pickle.dump(self.settings, f, pickle.HIGHEST_PROTOCOL)
+    def saveSettings(self, key) :
+        self.settings.save(key)
+
+    def settingsChanged(self, gID) :
+        # running games keep text built from the guild's settings, let them rebuild it
+        for active in self.active.values() :
+            if active["guild"] == gID :
+                active["game"].refreshSettings()
+
+    async def maintainSettings(self) :
+        # write back changed settings every few seconds, and compact the store occasionally
+        sinceCompact = 0
+
+        while True :
+            await asyncio.sleep(self.flushInterval)
+            await self.settings.write(self.loop, self.storeExecutor)
+            await self.snapshots.write(self.loop, self.storeExecutor)
+            await self.playerGames.write(self.loop, self.storeExecutor)
+            await self.gameLog.flush(self.loop)
+
+            sinceCompact += self.flushInterval
+            if sinceCompact >= self.compactInterval and self.cluster == 0 :
+                sinceCompact = 0
+                await self.loop.run_in_executor(self.storeExecutor, self.settings.store.compact)
+
+    def clusterFile(self, path) :
+        if self.cluster == 0 :
+            return path
+
+        base, extension = os.path.splitext(path)
+        return "{}-{}{}".format(base, self.cluster, extension)
+
+    def clusterStats(self) :
+        return {
+            "cluster" : self.cluster,
+            "shards"  : sorted(self.shards.keys()),
+            "guilds"  : len(self.guilds),
+            "games"   : len(self.active),
+            "players" : len(self.playerGames)
+        }
 
-    async def updatePresenceCount(self) :
-        activity = discord.Game(
-            "{} in {} server{}".format(
-                self.activity,
-                len(self.guilds),
-                "s" if len(self.guilds) > 1 else ""
-            )
+    async def publishStats(self) :
+        while True :
+            await self.loop.run_in_executor(self.storeExecutor, self.settings.store.publishStats, self.cluster, self.clusterStats())
+            self.settings.refresh("bot")
+            await asyncio.sleep(self.statsInterval)
+
+    def presenceText(self) :
+        text = "{} in {} server{}".format(
+            self.activity,
+            len(self.guilds),
+            "s" if len(self.guilds) > 1 else ""
         )
 
-        await self.change_presence(status=discord.Status.online, activity=activity)
+        if self.presenceShowGames and self.active :
+            text += ", {} game{} running".format(len(self.active), "s" if len(self.active) > 1 else "")
 
-    async def sendGuildIntro(self, guild) :
+        return text
+
+    def updatePresenceCount(self) :
+        self.presence.schedule()
+
+    def onboardGuild(self, guild) :
+        # settings are created straight away so the guild can be used, the intro DM goes on the onboarding queue
         self.generateSettings(guild.id)
+        self.onboarding.add(guild)
 
+    async def sendGuildIntro(self, guild) :
         try :
             await guild.owner.send('Thanks for inviting {0} into {1.name}! The default prefix this bot uses to listen for instructions in your Guild is `!`, to change this prefix message `!settings prefix <prefix>` from within your Guild.'.format(self.name, guild))
 
@@ -115,123 +396,195 @@ class GameBot(discord.Client) :
 
     def checkGuildPermissions(self, guild) :
         if "guild" in self.permissions :
-            def permissionPredicate(permission) :
-                return hasattr(guild.me.guild_permissions, permission) and not getattr(guild.me.guild_permissions, permission)
-
-            missing = list(filter(permissionPredicate, self.permissions["guild"]))
-            return missing
+            return self.permissionCache.missing(self.permissionCache.guild(guild, self.permissions["guild"]), self.permissions["guild"])
 
         return False
 
     def checkCategoryPermissions(self, channel) :
         if "category" in self.permissions and channel.category :
-            def permissionPredicate(permission) :
-                return hasattr(channel.category.permissions_for(channel.guild.me), permission) and not getattr(channel.category.permissions_for(channel.guild.me), permission)
-
-            missing = list(filter(permissionPredicate, self.permissions["category"]))
-            return missing
+            return self.permissionCache.missing(self.permissionCache.channel(channel.category, self.permissions["category"]), self.permissions["category"])
 
         return False
 
     def checkChannelPermissions(self, channel) :
         if "channel" in self.permissions:
-            def permissionPredicate(permission) :
-                return hasattr(channel.permissions_for(channel.guild.me), permission) and not getattr(channel.permissions_for(channel.guild.me), permission)
-
-            missing = list(filter(permissionPredicate, self.permissions["channel"]))
-            return missing
+            return self.permissionCache.missing(self.permissionCache.channel(channel, self.permissions["channel"]), self.permissions["channel"])
 
         return False
 
-    async def logException(self, exception) :
-        if "logChannel" in self.settings["bot"] :
-            guildID, channelID = self.settings["bot"]["logChannel"]
-            channel = self.get_channel(channelID)
-
-            if channel :
-                trace = traceback.format_exception(type(exception), exception, exception.__traceback__)
-                message = ""
-                for line in trace :
-                    message += "```python\n{}```".format(line)
-
-                await channel.send(message)
+    def logException(self, exception) :
+        # never blocks, the exception sink posts a digest to the log channel in the background
+        self.exceptions.report(exception)
 
     # Discord Events
     async def on_ready(self) :
+        if not self.settingsTask :
+            self.settingsTask = self.loop.create_task(self.maintainSettings())
+
+        if not self.statsTask :
+            self.statsTask = self.loop.create_task(self.publishStats())
+
+        if self.playerGames.shared and not self.forwardTask :
+            self.forwardTask = self.loop.create_task(self.receiveForwarded())
+
+        self.onboarding.start()
+        self.exceptions.start()
+        known = self.settings.keys()
+
         for guild in self.guilds :
-            if guild.id not in self.settings :
-                await self.sendGuildIntro(guild)
+            if guild.id not in known :
+                self.onboardGuild(guild)
+
+        if not self.rehydrated :
+            # on_ready runs again after reconnecting, by then the games never stopped
+            self.rehydrated = True
+            await self.rehydrate()
+
+        await self.presence.update()
+        await self.serveMetrics()
 
-        await self.updatePresenceCount()
+        logger.info('{} launched, active on {} guilds ({} guild intros queued)'.format(self.name, len(self.guilds), self.onboarding.queue.qsize()))
 
-        logger.info('{} launched, active on {} guilds'.format(self.name, len(self.guilds)))
+    async def serveMetrics(self) :
+        # last, the bot runs fine without metrics - if the port's taken it's tried again on the next on_ready
+        if self.metricsPort is not None and not self.metrics.server :
+            port = self.metricsPort + self.cluster
+
+            try :
+                await self.metrics.serve(self.metricsHost, port)
+            except OSError as e :
+                logger.warning("Couldn't serve metrics on {}:{} - {}".format(self.metricsHost, port, e))
 
     async def on_guild_join(self, guild) :
         logger.info("Joined guild {}".format(guild.name))
-        await self.sendGuildIntro(guild)
-        await self.updatePresenceCount()
+        self.onboardGuild(guild)
+        self.updatePresenceCount()
 
     async def on_guild_remove(self, guild) :
         logger.info("Left guild {}".format(guild.name))
 
-        if guild.id in self.settings :
+        if self.settings.known(guild.id) :
             del self.settings[guild.id]
 
-        await self.updatePresenceCount()
+        self.permissionCache.forgetGuild(guild.id)
+        self.updatePresenceCount()
+
+    # anything that can change the bot's permissions drops them from the cache
+    async def on_guild_channel_update(self, before, after) :
+        self.permissionCache.forgetChannel(after)
+
+    async def on_guild_channel_delete(self, channel) :
+        self.permissionCache.forgetChannel(channel)
+
+    async def on_guild_role_update(self, before, after) :
+        self.permissionCache.forgetGuild(after.guild.id)
+
+    async def on_guild_role_delete(self, role) :
+        self.permissionCache.forgetGuild(role.guild.id)
+
+    async def on_member_update(self, before, after) :
+        if after.id == self.user.id :
+            self.permissionCache.forgetGuild(after.guild.id)
 
     async def on_message(self, message) :
+        started = time.perf_counter()
+        kind = "ignored"
+        context(message.guild.id if message.guild else None, message.channel.id)
+
         try :
+            content = message.content
             globalPrefix = self.settings["bot"]["prefix"]
-            activeGame = userInActiveGame(message.author.id, self.active)
+            activeGame = False
 
-            if message.guild and message.guild.id in self.settings :
+            if message.guild :
                 # message send within a guild (so in a channel)
-                guildPrefix = self.settings[message.guild.id]["prefix"]
+                guildPrefix = self.settings[message.guild.id]["prefix"] if message.guild.id in self.settings else False
 
-            elif (isDM(message) and activeGame) :
+            elif isDM(message) :
                 # message sent in DM by somebody in an active game - FUTURE: handle guild commands in DMs too
-                guildPrefix = self.settings[self.active[activeGame]["guild"]]["prefix"]
+                activeGame = userInActiveGame(message.author.id, self.playerGames)
+                owner = self.playerGames.elsewhere(message.author.id) if activeGame is False else None
+
+                if owner is not None :
+                    kind = "forwarded"
+                    await self.loop.run_in_executor(self.storeExecutor, self.settings.store.forward, owner, message.author.id, content)
+                    return
+
+                guildPrefix = self.settings[self.active[activeGame]["guild"]]["prefix"] if activeGame in self.active else False
 
             else :
                 guildPrefix = False
 
-            if guildPrefix and hasPrefix(message, guildPrefix) :
-                guildMatched = await self.handleCommand(message, guildPrefix, self.guildHandlers)
-                gameMatched = await self.handleCommand(message, guildPrefix, self.handlers)
+            isGuildCommand = guildPrefix is not False and content.startswith(guildPrefix)
+            isBotCommand = content.startswith(globalPrefix)
 
-                if not (guildMatched or gameMatched) :
-                    sentInDMWithActiveGame = activeGame and isDM(message)
-                    recognisedGuild = message.guild and message.guild.id in self.settings
-                    sentInActiveChannel = recognisedGuild and message.channel.id in self.settings[message.guild.id]["activeChannels"]
-                    sentInMafiaChannel = message.channel.id in self.mafiaChannels
+            if not (isGuildCommand or isBotCommand) :
+                return
 
-                    if sentInDMWithActiveGame or (recognisedGuild and (sentInActiveChannel or sentInMafiaChannel)) :
-                        if sentInDMWithActiveGame :
-                            id = activeGame
-                        elif sentInMafiaChannel :
-                            id = self.mafiaChannels[message.channel.id] # map mafia channel to game
-                        else :
-                            id = message.channel.id
+            kind = "command"
 
-                        if id in self.active :
-                            await self.active[id]["game"].on_message(message)
+            if isGuildCommand :
+                command, args = parseCommand(content, guildPrefix)
+                handle = self.router.match("guild", command)
 
-            if hasPrefix(message, globalPrefix) :
-                await self.handleCommand(message, globalPrefix, self.globalHandlers)
+                if handle :
+                    await self.dispatch("guild", command, handle, message, args)
 
-        except Exception as e :
-            await self.logException(e)
+                else :
+                    await self.forwardToGame(message, activeGame, command, args)
 
-    async def handleCommand(self, message, prefix, handlers) :
-        command, args = parseMessage(message, prefix)
+            if isBotCommand :
+                command, args = parseCommand(content, globalPrefix)
+                handle = self.router.match("bot", command)
 
-        if command in handlers and handlers[command] :
-            handle = getattr(self, handlers[command])
-            await handle(message, args)
-            return True
+                if handle :
+                    await self.dispatch("bot", command, handle, message, args)
 
-        else :
-            return False
+        except Exception as e :
+            self.logException(e)
+
+        finally :
+            self.metrics["message_seconds"].observe(time.perf_counter() - started, kind)
+
+    async def receiveForwarded(self) :
+        while True :
+            await asyncio.sleep(self.forwardInterval)
+
+            try :
+                forwarded = await self.loop.run_in_executor(self.storeExecutor, self.settings.store.takeForwarded, self.cluster, time.time() - self.forwardExpiry)
+            except Exception as e :
+                self.logException(e)
+                continue
+
+            for uID, content in forwarded :
+                if uID not in self.playerGames :
+                    # their game has ended since
+                    continue
+
+                try :
+                    user = self.get_user(uID) or await self.fetch_user(uID)
+                    channel = user.dm_channel or await user.create_dm()
+                    await self.on_message(ForwardedMessage(user, channel, content))
+
+                except discord.errors.HTTPException as e :
+                    self.logException(e)
+
+    async def forwardToGame(self, message, activeGame, command, args) :
+        sentInDMWithActiveGame = activeGame and isDM(message)
+        recognisedGuild = message.guild and message.guild.id in self.settings
+        sentInActiveChannel = recognisedGuild and message.channel.id in self.settings[message.guild.id]["activeChannels"]
+        sentInMafiaChannel = message.channel.id in self.mafiaChannels
+
+        if sentInDMWithActiveGame or (recognisedGuild and (sentInActiveChannel or sentInMafiaChannel)) :
+            if sentInDMWithActiveGame :
+                id = activeGame
+            elif sentInMafiaChannel :
+                id = self.mafiaChannels[message.channel.id] # map mafia channel to game
+            else :
+                id = message.channel.id
+
+            if id in self.active :
+                await self.active[id]["game"].on_message(message, command, args)
 
     # Command Handlers
     @guard.botManager
@@ -240,19 +593,89 @@ class GameBot(discord.Client) :
 
     @guard.botManager
     async def cBotStats(self, message, args) :
+        await self.loop.run_in_executor(self.storeExecutor, self.settings.store.publishStats, self.cluster, self.clusterStats())
+        clusters = self.settings.store.readStats(time.time() - (self.statsInterval * 2))
+
         embed = discord.Embed(
             title="{}".format(self.name),
-            description="Currently running on {0} server{1} ({2}), with {3} active game{4}".format(
+            description="Currently running on {0} server{1} ({2}), with {3} active game{4}\n\nGuild intros: {5}".format(
                 len(self.guilds),
                 "s" if len(self.guilds) != 1 else "",
                 ", ".join([g.name for g in self.guilds]),
                 len(self.active),
                 "s" if len(self.active) != 1 else "",
+                self.onboarding.summary()
             ),
             colour=Colours.LUMINOUS_VIVID_PINK
         )
+
+        if len(clusters) > 1 :
+            embed.add_field(
+                name="All clusters",
+                value="{0} clusters, {1} shards, {2} servers, {3} active games, {4} players".format(
+                    len(clusters),
+                    sum([ len(c["shards"]) for c in clusters ]),
+                    sum([ c["guilds"] for c in clusters ]),
+                    sum([ c["games"] for c in clusters ]),
+                    sum([ c["players"] for c in clusters ])
+                ),
+                inline=False
+            )
+
+        embed.set_footer(text="Cluster {} (shards {})".format(self.cluster, ", ".join([ str(s) for s in sorted(self.shards.keys()) ])))
         await message.channel.send(embed=embed) # TODO
 
+    @guard.botManager
+    async def cBotProfile(self, message, args) :
+        if self.profileTask and not self.profileTask.done() :
+            await message.channel.send("Already profiling, wait for that to finish first")
+            return
+
+        try :
+            seconds = min(self.profileLimit, max(1, int(args[1]))) if len(args) > 1 else 30
+        except ValueError :
+            await message.channel.send("Usage: `profile <seconds>`")
+            return
+
+        # runs in the background, so this command doesn't hold up anything (or show up as slow in the metrics)
+        self.profileTask = self.loop.create_task(self.runProfile(message.channel, seconds))
+        await message.channel.send("Profiling for {} seconds...".format(seconds))
+
+    async def runProfile(self, channel, seconds) :
+        try :
+            profile = await self.profiler.run(seconds)
+            path = await self.loop.run_in_executor(None, profile.write, self.profileDirectory)
+
+            embed = discord.Embed(
+                title="Profile",
+                description="{} samples over {} seconds, `on_message` in {:.1%} and games in {:.1%} of them".format(
+                    profile.samples,
+                    seconds,
+                    profile.share(lambda f : f.endswith(":GameBot.on_message")),
+                    profile.share(lambda f : f.startswith("game.py:Game."))
+                ),
+                colour=Colours.BLUE
+            )
+
+            leaves = "\n".join("`{}` {:.1%}".format(f, count / profile.samples) for f, count in profile.leaves(8))
+            embed.add_field(name="Busiest functions", value=leaves or "Nothing but waiting", inline=False)
+
+            slow = sorted(profile.slow, reverse=True)[:5]
+            embed.add_field(
+                name="Slow callbacks ({})".format(len(profile.slow)),
+                value="\n".join("{:.3f}s `{}`".format(s, stack[-100:]) for s, stack in slow) or "None",
+                inline=False
+            )
+
+            tasks = "\n".join("`{}` {:.1f}".format(t, count / max(1, profile.taskSamples)) for t, count in profile.tasks.most_common(5))
+            embed.add_field(name="Tasks (average running)", value=tasks or "None", inline=False)
+            embed.set_footer(text="Collapsed stacks for a flamegraph attached, and saved as {}".format(path))
+
+            await channel.send(embed=embed, file=discord.File(path))
+
+        except Exception as e :
+            self.logException(e)
+
     @guard.onlyChannel
     @guard.botManager
     async def cBotLeave(self, message, args) :
@@ -278,13 +701,16 @@ class GameBot(discord.Client) :
 
             if option == "prefix" and len(args) > 2 :
                 self.settings["bot"]["prefix"] = args[2]
+                self.saveSettings("bot")
                 await message.channel.send("Prefix changed to {}".format(args[2]))
 
             elif option == "adduser" and len(message.mentions) > 0 :
                 self.settings["bot"]["manage"].append(message.mentions[0].id)
+                self.saveSettings("bot")
 
             elif option == "removeuser" and len(message.mentions) > 0 and message.mentions[0].id in self.settings["bot"]["manageUsers"]:
                 self.settings["bot"]["manage"].remove(message.mentions[0].id)
+                self.saveSettings("bot")
 
         await message.channel.send("```python\n{}```".format(self.settings))
 
@@ -292,7 +718,33 @@ class GameBot(discord.Client) :
     @guard.botManager
     async def cBotLogSet(self, message, args) :
         self.settings["bot"]["logChannel"] = (message.guild.id, message.channel.id)
-        await message.channel.send("{} will now log exceptions in this channel".format(self.name))
+        self.saveSettings("bot")
+        await message.channel.send("{} will now log exceptions in this channel (as a digest every {} seconds)".format(self.name, self.exceptionInterval))
+
+    @guard.botManager
+    async def cBotLogLevel(self, message, args) :
+        # loglevel <logger> <level|default>, saved so it lasts across restarts
+        levels = self.settings["bot"].setdefault("logLevels", {})
+
+        if len(args) > 2 :
+            name, level = args[1], args[2].upper()
+
+            if level == "DEFAULT" :
+                levels.pop(name, None)
+                setLevels({ name : self.logLevels.get(name, "NOTSET") })
+
+            elif isinstance(logging.getLevelName(level), int) :
+                levels[name] = level
+                setLevels({ name : level })
+
+            else :
+                await message.channel.send("`{}` isn't a log level".format(args[2]))
+                return
+
+            self.saveSettings("bot")
+
+        current = { **self.logLevels, **levels }
+        await message.channel.send("```{}```".format("\n".join("{} {}".format(name, level) for name, level in sorted(current.items()))))
 
     @guard.botManager
     def cBotTestException(self, message, args) :
@@ -319,34 +771,62 @@ class GameBot(discord.Client) :
 
             if option == "prefix" and len(args) > 2 :
                 self.settings[message.guild.id]["prefix"] = args[2]
+                self.saveSettings(message.guild.id)
+                self.settingsChanged(message.guild.id)
                 await message.channel.send("Prefix changed to `{}`".format(args[2]))
 
             elif option == "adduser" and len(message.mentions) > 0 :
                 self.settings[message.guild.id]["manageUsers"].append(message.mentions[0].id)
+                self.saveSettings(message.guild.id)
                 await message.channel.send("{0.mention} added to the manager list".format(message.mentions[0]))
 
             elif option == "removeuser" and len(message.mentions) > 0 and message.mentions[0].id in self.settings[message.guild.id]["manageUsers"]:
                 self.settings[message.guild.id]["manageUsers"].remove(message.mentions[0].id)
+                self.saveSettings(message.guild.id)
                 await message.channel.send("{0.mention} removed from the manager list".format(message.mentions[0]))
 
             elif option == "addrole" and len(message.role_mentions) > 0 :
                 self.settings[message.guild.id]["manageRoles"].append(message.role_mentions[0].id)
+                self.saveSettings(message.guild.id)
                 await message.channel.send("Role {0.mention} added to the manager list".format(message.role_mentions[0]))
 
             elif option == "removerole" and len(message.role_mentions) > 0 and message.role_mentions[0].id in self.settings[message.guild.id]["manageRoles"]:
                 self.settings[message.guild.id]["manageRoles"].remove(message.role_mentions[0].id)
+                self.saveSettings(message.guild.id)
                 await message.channel.send("Role {0.mention} removed from the manager list".format(message.role_mentions[0]))
 
+            elif option == "locale" and len(args) > 2 :
+                self.settings[message.guild.id]["locale"] = args[2]
+                self.saveSettings(message.guild.id)
+                self.settingsChanged(message.guild.id)
+                await message.channel.send("Locale changed to `{}`".format(args[2]))
+
+            elif option == "timeout" and len(args) > 3 :
+                # seconds a game phase can run for, 0 turns the timeout off
+                if args[2] not in self.timeoutPhases :
+                    phases = ", ".join([ "`{}`".format(p) for p in self.timeoutPhases ])
+                    await message.channel.send("There's no `{}` timeout, it can be set for {}".format(args[2], phases))
+
+                elif not args[3].isdigit() :
+                    await message.channel.send("Timeouts are a whole number of seconds, `0` turns it off")
+
+                else :
+                    self.settings[message.guild.id].setdefault("timeouts", {})[args[2]] = int(args[3])
+                    self.saveSettings(message.guild.id)
+                    await message.channel.send("Timeout for `{}` set to {} seconds".format(args[2], args[3]))
+
         else :
             await message.channel.send("```python\n{}```".format(self.settings[message.guild.id]))
 
     @guard.guildManager
     def cGuildEnable(self, message, args) :
         self.settings[message.guild.id]["disabled"] = False
+        self.saveSettings(message.guild.id)
 
     @guard.guildManager
     def cGuildDisable(self, message, args) :
         self.settings[message.guild.id]["disabled"] = True
+        self.saveSettings(message.guild.id)
 
     @guard.onlyChannel
     @guard.guildManager
@@ -377,10 +857,12 @@ class GameBot(discord.Client) :
 
             else :
                 self.settings[message.guild.id]["activeChannels"].append(channel.id)
+                self.saveSettings(message.guild.id)
                 await message.channel.send("{0} now active in {1.mention}".format(self.name, channel))
 
     @guard.onlyActiveChannel
     @guard.guildManager
     async def cGuildRemove(self, message, args) :
         self.settings[message.guild.id]["activeChannels"].remove(message.channel.id)
+        self.saveSettings(message.guild.id)
         await message.channel.send("No longer active in {0.mention}".format(message.channel))
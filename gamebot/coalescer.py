@@ -0,0 +1,52 @@
+class Coalescer :
+    # merges chatty lines posted to the same channel within a short window into as few messages as possible
+    # anything sent through it flushes that channel's waiting lines first, so messages still arrive in order
+
+    limit = 2000
+
+    def __init__(self, timers, worker, window=1) :
+        # flushes are queued on the worker so they keep their place among everything else it's sending
+        self.timers = timers
+        self.worker = worker
+        self.window = window
+        self.pending = {} # channel -> [lines]
+
+    def post(self, channel, line) :
+        if channel not in self.pending :
+            self.pending[channel] = []
+            self.timers.set(("coalesce", channel.id), self.window, self.worker.submit, self.flush, channel)
+
+        self.pending[channel].append(line)
+
+    async def send(self, channel, *args, **kwargs) :
+        await self.flush(channel)
+        return await channel.send(*args, **kwargs)
+
+    async def flush(self, channel=None) :
+        for c in ([ channel ] if channel is not None else list(self.pending)) :
+            lines = self.pending.pop(c, None)
+
+            if lines :
+                self.timers.cancel(("coalesce", c.id))
+
+                for message in self.pack(lines) :
+                    await c.send(message)
+
+    def pack(self, lines) :
+        messages = [ ]
+
+        for line in lines :
+            line = line[:self.limit]
+
+            if messages and len(messages[-1]) + len(line) < self.limit :
+                messages[-1] += "\n" + line
+            else :
+                messages.append(line)
+
+        return messages
+
+    def stop(self) :
+        for channel in self.pending :
+            self.timers.cancel(("coalesce", channel.id))
+
+        self.pending = {}
@@ -0,0 +1,120 @@
+import asyncio
+import hashlib
+import logging
+import traceback
+from collections import OrderedDict
+
+import discord
+
+from gamebot.logs import (logs, RotatingHandler)
+
+class ExceptionSink :
+    # collects exceptions without blocking the caller, repeats of the same traceback are counted rather than resent
+    # a digest is posted to the log channel every interval, and full traces are logged to gamebot.exceptions, which
+    # the log listener thread writes to its own file
+
+    messageLimit = 2000
+
+    def __init__(self, bot, interval=60, path="exceptions.log", maxBytes=5 * 1024 * 1024, backupCount=3, maxPending=100) :
+        self.bot = bot
+        self.interval = interval
+        self.maxPending = maxPending
+        self.pending = OrderedDict() # fingerprint -> { count, summary, trace }
+        self.seen = {} # fingerprint -> total count since startup
+        self.dropped = 0
+        self.task = None
+
+        self.file = logging.getLogger('gamebot.exceptions')
+        self.file.propagate = False
+
+        if 'gamebot.exceptions' not in logs.routes :
+            # written by the log listener thread, not whoever reports the exception
+            logs.attach(['gamebot.exceptions'], RotatingHandler(path, maxBytes, backupCount, interval=None), logging.Formatter('%(asctime)s: %(message)s'))
+
+    @staticmethod
+    def fingerprint(exception) :
+        # the exception type and where it was raised from, so the same bug with different values matches
+        frames = traceback.extract_tb(exception.__traceback__)
+        key = "|".join([ type(exception).__qualname__ ] + [ "{}:{}:{}".format(f.filename, f.lineno, f.name) for f in frames ])
+        return hashlib.sha1(key.encode()).hexdigest()[:10]
+
+    def report(self, exception) :
+        fingerprint = self.fingerprint(exception)
+        self.seen[fingerprint] = self.seen.get(fingerprint, 0) + 1
+
+        if fingerprint in self.pending :
+            self.pending[fingerprint]["count"] += 1
+
+        elif len(self.pending) < self.maxPending :
+            self.pending[fingerprint] = {
+                "count"   : 1,
+                "summary" : "".join(traceback.format_exception_only(type(exception), exception)).strip(),
+                "trace"   : "".join(traceback.format_exception(type(exception), exception, exception.__traceback__))
+            }
+
+        else :
+            self.dropped += 1
+
+    def start(self) :
+        if not self.task :
+            self.task = self.bot.loop.create_task(self.run())
+
+    def stop(self) :
+        if self.task :
+            self.task.cancel()
+            self.task = None
+
+    async def run(self) :
+        while True :
+            await asyncio.sleep(self.interval)
+            await self.flush()
+
+    async def flush(self) :
+        batch, self.pending = self.pending, OrderedDict()
+        dropped, self.dropped = self.dropped, 0
+
+        if not batch :
+            return
+
+        # only queues the records, the listener thread does the writing
+        self.write(batch)
+
+        try :
+            await self.post(batch, dropped)
+        except discord.errors.HTTPException :
+            pass
+
+    def write(self, batch) :
+        for fingerprint, entry in batch.items() :
+            self.file.error("[{}] x{}\n{}".format(fingerprint, entry["count"], entry["trace"]))
+
+    async def post(self, batch, dropped) :
+        channel = self.logChannel()
+        if not channel :
+            return
+
+        lines = []
+        for fingerprint, entry in batch.items() :
+            if self.seen[fingerprint] == entry["count"] :
+                # first time this has come up, so include the trace
+                lines.append("`{}` x{} (new)\n```python\n{}```".format(fingerprint, entry["count"], entry["trace"][-1500:]))
+            else :
+                lines.append("`{}` x{} ({} total) - {}".format(fingerprint, entry["count"], self.seen[fingerprint], entry["summary"][:200]))
+
+        if dropped :
+            lines.append("...and {} more not recorded".format(dropped))
+
+        message = "**Exceptions in the last {}s**".format(self.interval)
+        for line in lines :
+            if len(message) + len(line) + 1 > self.messageLimit :
+                await channel.send(message)
+                message = ""
+
+            message += "\n" + line
+
+        await channel.send(message)
+
+    def logChannel(self) :
+        if "logChannel" in self.bot.settings["bot"] :
+            guildID, channelID = self.bot.settings["bot"]["logChannel"]
+            return self.bot.get_channel(channelID)
@@ -0,0 +1,40 @@
+import asyncio
+
+import discord
+
+class FanOut :
+    # batches independent sends and runs them concurrently, sends queued under the same key keep their order
+
+    def __init__(self, limit=5) :
+        self.limit = limit
+        self.queues = {}
+
+    def send(self, destination, *args, **kwargs) :
+        # a destination that couldn't be found (None) is skipped
+        if destination is None :
+            return self
+
+        return self.call(destination, destination.send, *args, **kwargs)
+
+    def call(self, key, coroutine, *args, **kwargs) :
+        self.queues.setdefault(key, []).append((coroutine, args, kwargs))
+        return self
+
+    async def flush(self) :
+        # returns a list of (key, exception) for every destination that failed, later sends to that key are dropped
+        queues, self.queues = self.queues, {}
+        semaphore = asyncio.Semaphore(self.limit)
+        failures = []
+
+        async def drain(key, calls) :
+            async with semaphore :
+                for coroutine, args, kwargs in calls :
+                    try :
+                        await coroutine(*args, **kwargs)
+
+                    except discord.errors.HTTPException as e :
+                        failures.append((key, e))
+                        return
+
+        await asyncio.gather(*[ drain(key, calls) for key, calls in queues.items() ])
+        return failures
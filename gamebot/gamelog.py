@@ -0,0 +1,57 @@
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from enum import Enum
+
+class GameLog :
+    # append-only JSON lines log for each game, one record per line
+    # records are only buffered when they happen, the bot flushes them to disk on a single background thread
+    # so the files are written in order without the event loop waiting on them
+
+    def __init__(self, directory) :
+        # no directory turns the log off
+        self.directory = directory
+        self.pending = {} # file name -> [records]
+        self.executor = ThreadPoolExecutor(1) if directory else None
+
+    def __len__(self) :
+        return sum(len(records) for records in self.pending.values())
+
+    def record(self, name, action, **values) :
+        if self.directory :
+            self.pending.setdefault(name, []).append({ "t" : round(time.time(), 3), "action" : action, **values })
+
+    async def flush(self, loop) :
+        pending, self.pending = self.pending, {}
+
+        if pending :
+            await loop.run_in_executor(self.executor, self.write, pending)
+
+    def write(self, pending) :
+        os.makedirs(self.directory, exist_ok=True)
+
+        for name, records in pending.items() :
+            with open(os.path.join(self.directory, name), "a", encoding="utf-8") as f :
+                f.writelines([ self.encode(record) + "\n" for record in records ])
+
+    def stop(self) :
+        if self.executor :
+            self.executor.shutdown()
+
+    @classmethod
+    def encode(cls, record) :
+        return json.dumps(record, separators=(",", ":"), default=cls.encodeValue)
+
+    @staticmethod
+    def encodeValue(value) :
+        # enums (roles, states, who won) are written by name
+        if isinstance(value, Enum) :
+            return value.name
+
+        raise TypeError("Can't log {!r}".format(value))
+
+    @staticmethod
+    def read(path) :
+        with open(path, encoding="utf-8") as f :
+            return [ json.loads(line) for line in f if line.strip() ]
@@ -10,14 +10,9 @@ def hasPrefix(message, prefix) :
     if(message.content[:chars] == prefix) : return True
     return False
 
-def userInActiveGame(aID, games) :
-    # get the channel ID of the active game a user is in
-    active = [ k for k,v in games.items() if v["game"].hasUser(aID) ]
-
-    if len(active) == 1 :
-        return active[0]
-    else :
-        return False
+def userInActiveGame(aID, index) :
+    # get the channel ID of the active game a user is in, index maps user ID -> game channel ID
+    return index.get(aID, False)
 
 def canManageGuild(author, guild) :
     guildOwner = guild.owner == author
@@ -31,7 +26,10 @@ def guildsUserCanManage(author, guilds) :
     return active
 
 def parseMessage(message, prefix) :
-    args = message.content.split(" ")
+    return parseCommand(message.content, prefix)
+
+def parseCommand(content, prefix) :
+    args = content.split(" ")
     args[0] = args[0][len(prefix):]
     command = args[0].lower()
 
@@ -0,0 +1,133 @@
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import queue
+import time
+
+# the guild, channel and game being handled, stamped on every record logged while handling them
+guildID = contextvars.ContextVar("guildID", default=None)
+channelID = contextvars.ContextVar("channelID", default=None)
+gameID = contextvars.ContextVar("gameID", default=None)
+
+def context(guild=None, channel=None, game=None) :
+    # set for the current task (and any it starts), so it doesn't need passing down to whatever logs
+    guildID.set(guild)
+    channelID.set(channel)
+    gameID.set(game)
+
+class ContextFilter(logging.Filter) :
+
+    def filter(self, record) :
+        record.guild = guildID.get()
+        record.channel = channelID.get()
+        record.game = gameID.get()
+        return True
+
+class StructuredFormatter(logging.Formatter) :
+    # one JSON object per line, with the guild/channel/game IDs when there are any
+
+    fields = ("guild", "channel", "game")
+
+    def format(self, record) :
+        entry = {
+            "time"    : self.formatTime(record),
+            "level"   : record.levelname,
+            "logger"  : record.name,
+            "message" : record.getMessage()
+        }
+
+        for field in self.fields :
+            value = getattr(record, field, None)
+
+            if value is not None :
+                entry[field] = value
+
+        return json.dumps(entry)
+
+class RotatingHandler(logging.handlers.RotatingFileHandler) :
+    # rolls the file over once it reaches maxBytes or has been open for interval seconds, whichever comes first
+
+    def __init__(self, path, maxBytes=10 * 1024 * 1024, backupCount=5, interval=24 * 60 * 60) :
+        super().__init__(path, maxBytes=maxBytes, backupCount=backupCount, encoding="utf-8", delay=True)
+        self.interval = interval
+        self.rolloverAt = time.time() + interval if interval else None
+
+    def shouldRollover(self, record) :
+        if self.rolloverAt is not None and time.time() >= self.rolloverAt :
+            return True
+
+        return super().shouldRollover(record)
+
+    def doRollover(self) :
+        super().doRollover()
+
+        if self.interval :
+            self.rolloverAt = time.time() + self.interval
+
+class Listener(logging.handlers.QueueListener) :
+
+    def __init__(self, logs) :
+        super().__init__(logs.queue)
+        self.logs = logs
+
+    def handle(self, record) :
+        # called on the listener thread
+        handler = self.logs.route(record.name)
+
+        if handler is not None and record.levelno >= handler.level :
+            handler.handle(record)
+
+class LogQueue :
+    # logging that never blocks the event loop - loggers only put records on a queue, and a listener thread
+    # formats them and writes them to their files
+    # each file is attached to one or more logger names, a record goes to the file of its closest attached ancestor
+
+    def __init__(self) :
+        self.queue = queue.SimpleQueue()
+        self.handler = logging.handlers.QueueHandler(self.queue)
+        self.handler.addFilter(ContextFilter())
+        self.routes = {} # logger name -> file handler
+        self.listener = None
+
+    def attach(self, names, handler, formatter=None) :
+        handler.setFormatter(formatter or StructuredFormatter())
+
+        for name in names :
+            self.routes[name] = handler
+            logger = logging.getLogger(name)
+
+            if self.handler not in logger.handlers :
+                logger.addHandler(self.handler)
+
+        self.start()
+
+    def route(self, name) :
+        while name not in self.routes and "." in name :
+            name = name.rsplit(".", 1)[0]
+
+        return self.routes.get(name)
+
+    def start(self) :
+        if self.listener is None :
+            self.listener = Listener(self)
+            self.listener.start()
+
+    def stop(self) :
+        # writes out anything still queued first
+        if self.listener is not None :
+            self.listener.stop()
+            self.listener = None
+
+            for handler in set(self.routes.values()) :
+                handler.close()
+
+def setLevels(levels) :
+    # per subsystem (logger name) levels, e.g. { "discord.gateway" : "WARNING" }
+    for name, level in levels.items() :
+        logging.getLogger(name).setLevel(level)
+
+# shared by every bot in the process, flushed when the process exits
+logs = LogQueue()
+atexit.register(logs.stop)
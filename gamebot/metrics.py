@@ -0,0 +1,172 @@
+import asyncio
+import logging
+from bisect import bisect_left
+
+class Metric :
+    # one named metric with a series per combination of label values, rendered in the Prometheus text format
+
+    kind = "untyped"
+
+    def __init__(self, name, help, labels=()) :
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.series = {} # label values -> value
+
+    def render(self) :
+        lines = [ "# HELP {} {}".format(self.name, self.help), "# TYPE {} {}".format(self.name, self.kind) ]
+
+        for values, value in sorted(self.collect().items()) :
+            lines.append("{}{} {}".format(self.name, self.labelText(values), value))
+
+        return lines
+
+    def collect(self) :
+        return self.series
+
+    def labelText(self, values, extra=()) :
+        pairs = list(zip(self.labels, values)) + list(extra)
+
+        if not pairs :
+            return ""
+
+        return "{" + ",".join('{}="{}"'.format(k, escape(v)) for k, v in pairs) + "}"
+
+class Counter(Metric) :
+
+    kind = "counter"
+
+    def inc(self, *values, amount=1) :
+        self.series[values] = self.series.get(values, 0) + amount
+
+class Gauge(Metric) :
+    # worked out only when scraped, collect returns { label values : value }
+
+    kind = "gauge"
+
+    def __init__(self, name, help, labels=(), collect=None) :
+        super().__init__(name, help, labels)
+        self.collector = collect
+
+    def collect(self) :
+        return self.collector()
+
+class Histogram(Metric) :
+
+    kind = "histogram"
+
+    # seconds, suited to handling a message or a REST call
+    latency = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+    def __init__(self, name, help, labels=(), buckets=latency) :
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, amount, *values) :
+        # a count per bucket (not cumulative until rendered) and the running sum
+        series = self.series.get(values)
+
+        if series is None :
+            series = self.series[values] = [ [ 0 ] * (len(self.buckets) + 1), 0 ]
+
+        series[0][bisect_left(self.buckets, amount)] += 1
+        series[1] += amount
+
+    def render(self) :
+        lines = [ "# HELP {} {}".format(self.name, self.help), "# TYPE {} {}".format(self.name, self.kind) ]
+
+        for values, (counts, total) in sorted(self.series.items()) :
+            cumulative = 0
+
+            for bound, count in zip(self.buckets + ("+Inf",), counts) :
+                cumulative += count
+                lines.append("{}_bucket{} {}".format(self.name, self.labelText(values, [ ("le", bound) ]), cumulative))
+
+            lines.append("{}_sum{} {}".format(self.name, self.labelText(values), total))
+            lines.append("{}_count{} {}".format(self.name, self.labelText(values), cumulative))
+
+        return lines
+
+class Metrics :
+    # the bot's metrics, served over HTTP for Prometheus to scrape
+    # recording is a dict update, everything else (gauges, the text format) only happens when somebody asks
+
+    def __init__(self, namespace) :
+        self.namespace = namespace
+        self.metrics = {}
+        self.server = None
+
+    def __getitem__(self, name) :
+        return self.metrics[name]
+
+    def add(self, metric) :
+        key = metric.name
+        metric.name = "{}_{}".format(self.namespace, metric.name)
+        self.metrics[key] = metric
+        return metric
+
+    def counter(self, name, help, labels=()) :
+        return self.add(Counter(name, help, labels))
+
+    def gauge(self, name, help, labels=(), collect=None) :
+        return self.add(Gauge(name, help, labels, collect))
+
+    def histogram(self, name, help, labels=(), buckets=Histogram.latency) :
+        return self.add(Histogram(name, help, labels, buckets))
+
+    def render(self) :
+        return "\n".join(line for metric in self.metrics.values() for line in metric.render()) + "\n"
+
+    async def serve(self, host, port) :
+        self.server = await asyncio.start_server(self.respond, host, port)
+
+    async def respond(self, reader, writer) :
+        try :
+            request = await asyncio.wait_for(reader.readline(), 5)
+
+            while await asyncio.wait_for(reader.readline(), 5) not in (b"\r\n", b"\n", b"") :
+                pass
+
+            parts = request.split()
+            path = parts[1].split(b"?")[0] if len(parts) > 1 else b""
+
+            if path == b"/metrics" :
+                status, body = "200 OK", self.render().encode("utf-8")
+            else :
+                status, body = "404 Not Found", b"Not found\n"
+
+            writer.write("HTTP/1.0 {}\r\nContent-Type: text/plain; version=0.0.4; charset=utf-8\r\nContent-Length: {}\r\n\r\n".format(status, len(body)).encode("ascii") + body)
+            await writer.drain()
+
+        except (asyncio.TimeoutError, ConnectionError) :
+            pass
+
+        finally :
+            writer.close()
+
+    def stop(self) :
+        if self.server :
+            self.server.close()
+            self.server = None
+
+class RateLimitCounter(logging.Filter) :
+    # discord.py retries 429s inside HTTPClient.request, the only sign of them is its warning, so that's counted
+
+    messages = {
+        "We are being rate limited" : "bucket",
+        "Global rate limit has been hit" : "global"
+    }
+
+    def __init__(self, counter) :
+        super().__init__()
+        self.counter = counter
+
+    def filter(self, record) :
+        for start, scope in self.messages.items() :
+            if isinstance(record.msg, str) and record.msg.startswith(start) :
+                self.counter.inc(scope)
+
+        return True
+
+def escape(value) :
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
@@ -0,0 +1,78 @@
+import asyncio
+import logging
+
+import discord
+
+logger = logging.getLogger('discord')
+
+class Onboarding :
+    # background queue that sends guild intros with a few workers, so startup never waits on owner DMs
+
+    def __init__(self, bot, workers=4, spacing=1, retries=3) :
+        self.bot = bot
+        self.workers = workers
+        self.spacing = spacing # seconds each worker waits between intros, keeps well under the DM rate limit
+        self.retries = retries
+
+        self.queue = asyncio.Queue()
+        self.pending = set()
+        self.attempts = {}
+        self.tasks = []
+        self.stats = { "queued" : 0, "sent" : 0, "failed" : 0, "retried" : 0 }
+
+    def start(self) :
+        if not self.tasks :
+            self.tasks = [ self.bot.loop.create_task(self.work()) for _ in range(self.workers) ]
+
+    def stop(self) :
+        for task in self.tasks :
+            task.cancel()
+
+        self.tasks = []
+
+    def add(self, guild) :
+        if guild.id not in self.pending :
+            self.pending.add(guild.id)
+            self.queue.put_nowait(guild)
+            self.stats["queued"] += 1
+
+    def summary(self) :
+        return "{0} waiting, {1[sent]} sent, {1[failed]} failed, {1[retried]} retried".format(self.queue.qsize(), self.stats)
+
+    async def work(self) :
+        while True :
+            guild = await self.queue.get()
+
+            try :
+                await self.bot.sendGuildIntro(guild)
+                self.finish(guild, "sent")
+
+            except discord.errors.HTTPException as e :
+                attempts = self.attempts.get(guild.id, 0) + 1
+
+                if e.status == 429 and attempts <= self.retries :
+                    # rate limited past discord.py's own retries, back off then try again
+                    self.attempts[guild.id] = attempts
+                    self.stats["retried"] += 1
+                    await asyncio.sleep(float(e.response.headers.get("Retry-After", self.spacing * 5)))
+                    self.queue.put_nowait(guild)
+
+                else :
+                    self.finish(guild, "failed")
+
+            except Exception as e :
+                self.finish(guild, "failed")
+                self.bot.logException(e)
+
+            finally :
+                self.queue.task_done()
+
+            await asyncio.sleep(self.spacing)
+
+    def finish(self, guild, outcome) :
+        self.pending.discard(guild.id)
+        self.attempts.pop(guild.id, None)
+        self.stats[outcome] += 1
+
+        if outcome == "failed" :
+            logger.info("Couldn't send intro to guild {}".format(guild.id))
@@ -0,0 +1,47 @@
+import discord
+
+class PermissionCache :
+    # the bot's resolved permissions per (channel, member), worked out once instead of on every check
+    # entries are dropped whenever something that could change them does - a channel's overwrites, a role, the bot's roles
+    # only what they grant is trusted though, anything required that an entry is missing is worked out again, as
+    # without the members intent the bot doesn't hear about being given a new role
+
+    def __init__(self) :
+        self.cache = {} # (channel ID, member ID) -> discord.Permissions, channel ID is the guild ID for guild permissions
+        self.guilds = {} # guild ID -> set of cache keys in that guild
+
+    def __len__(self) :
+        return len(self.cache)
+
+    def guild(self, guild, required=()) :
+        return self.lookup(guild.id, guild.id, guild.me, lambda : guild.me.guild_permissions, required)
+
+    def channel(self, channel, required=()) :
+        member = channel.guild.me
+        return self.lookup(channel.guild.id, channel.id, member, lambda : channel.permissions_for(member), required)
+
+    def lookup(self, gID, cID, member, resolve, required=()) :
+        key = (cID, member.id)
+
+        if key not in self.cache or self.missing(self.cache[key], required) :
+            self.cache[key] = resolve()
+            self.guilds.setdefault(gID, set()).add(key)
+
+        return self.cache[key]
+
+    def missing(self, permissions, required) :
+        # anything in required that isn't a real permission (e.g. in_category) is left for the caller to check
+        return [ p for p in required if p in discord.Permissions.VALID_FLAGS and not getattr(permissions, p) ]
+
+    def forgetChannel(self, channel) :
+        if isinstance(channel, discord.CategoryChannel) :
+            # channels synced with the category change with it
+            self.forgetGuild(channel.guild.id)
+        else :
+            for key in [ k for k in self.guilds.get(channel.guild.id, ()) if k[0] == channel.id ] :
+                self.guilds[channel.guild.id].discard(key)
+                self.cache.pop(key, None)
+
+    def forgetGuild(self, gID) :
+        for key in self.guilds.pop(gID, ()) :
+            self.cache.pop(key, None)
@@ -0,0 +1,74 @@
+class PlayerIndex :
+    # user ID -> channel ID of the game they're in, for this process's games
+    # when the bot runs as several clusters the index is shared through the settings store too, written behind like
+    # snapshots, so a cluster can tell a player is in a game elsewhere and which cluster is running it
+
+    def __init__(self, store, cluster, shared=False) :
+        self.store = store
+        self.cluster = cluster
+        self.shared = shared
+        self.games = {}
+        self.pending = {} # user ID -> channel ID, or None when they've left
+
+    def __len__(self) :
+        return len(self.games)
+
+    def __contains__(self, uID) :
+        return uID in self.games
+
+    def __getitem__(self, uID) :
+        return self.games[uID]
+
+    def __setitem__(self, uID, channelID) :
+        self.games[uID] = channelID
+
+        if self.shared :
+            self.pending[uID] = channelID
+
+    def __delitem__(self, uID) :
+        del self.games[uID]
+
+        if self.shared :
+            self.pending[uID] = None
+
+    def __repr__(self) :
+        return repr(self.games)
+
+    def clear(self) :
+        for uID in list(self.games) :
+            del self[uID]
+
+    def get(self, uID, default=None) :
+        return self.games.get(uID, default)
+
+    def elsewhere(self, uID) :
+        # the cluster running the player's game if it isn't this one, otherwise None
+        if not self.shared or uID in self.games :
+            return None
+
+        found = self.store.findPlayer(uID)
+        return found[0] if found and found[0] != self.cluster else None
+
+    def flush(self) :
+        pending, self.pending = self.pending, {}
+
+        if pending :
+            self.store.savePlayers(self.cluster, list(pending.items()))
+
+    async def write(self, loop, executor) :
+        pending, self.pending = self.pending, {}
+
+        if pending :
+            await loop.run_in_executor(executor, self.store.savePlayers, self.cluster, list(pending.items()))
+
+class ForwardedMessage :
+    # a DM passed on by the cluster that received it, handled as if it had been sent to this one
+
+    def __init__(self, author, channel, content) :
+        self.author = author
+        self.channel = channel
+        self.content = content
+        self.guild = None
+        self.mentions = []
+        self.role_mentions = []
+        self.channel_mentions = []
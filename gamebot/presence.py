@@ -0,0 +1,38 @@
+import asyncio
+
+import discord
+
+class PresenceScheduler :
+    # coalesces presence changes so at most one update is sent to the gateway per window
+
+    def __init__(self, bot, window=60) :
+        self.bot = bot
+        self.window = window
+        self.task = None
+        self.last = None
+        self.lastSent = None
+
+    def schedule(self) :
+        if not self.task :
+            self.task = self.bot.loop.create_task(self.run())
+
+    async def run(self) :
+        if self.lastSent is not None :
+            await asyncio.sleep(max(0, self.lastSent + self.window - self.bot.loop.time()))
+
+        # anything changing from here on needs another update
+        self.task = None
+        await self.update()
+
+    async def update(self) :
+        text = self.bot.presenceText()
+
+        if text != self.last :
+            self.last = text
+            self.lastSent = self.bot.loop.time()
+            await self.bot.change_presence(status=discord.Status.online, activity=discord.Game(text))
+
+    def stop(self) :
+        if self.task :
+            self.task.cancel()
+            self.task = None
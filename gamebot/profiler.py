@@ -0,0 +1,133 @@
+import asyncio
+import os.path
+import sys
+import threading
+import time
+from collections import (Counter, deque)
+
+class Profile :
+    # what a profiling run saw, stacks are collapsed (root;...;leaf) for flamegraph.pl or speedscope
+
+    def __init__(self, seconds, interval) :
+        self.seconds = seconds
+        self.interval = interval
+        self.stacks = Counter() # collapsed stack -> samples
+        self.tasks = Counter() # coroutine -> times seen running or waiting
+        self.taskSamples = 0
+        self.slow = [] # (seconds the loop was held up, the callback stack)
+
+    @property
+    def samples(self) :
+        return sum(self.stacks.values())
+
+    def collapsed(self) :
+        return "".join("{} {}\n".format(stack, count) for stack, count in self.stacks.most_common())
+
+    def write(self, directory) :
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, "profile-{}.folded".format(time.strftime("%Y%m%d-%H%M%S")))
+
+        with open(path, "w", encoding="utf-8") as f :
+            f.write(self.collapsed())
+
+        return path
+
+    def share(self, match) :
+        # fraction of samples with a frame matching
+        total = self.samples
+        return sum(count for stack, count in self.stacks.items() if any(match(f) for f in stack.split(";"))) / total if total else 0
+
+    def leaves(self, n, idle=("select", "poll", "_run_once")) :
+        # where the loop thread spent its own time, leaving out waiting for I/O
+        counts = Counter()
+
+        for stack, count in self.stacks.items() :
+            leaf = stack.rsplit(";", 1)[-1]
+
+            if not leaf.split(":")[-1].endswith(idle) :
+                counts[leaf] += count
+
+        return counts.most_common(n)
+
+class Profiler :
+    # samples the event loop thread's stack from a background thread every interval, so the bot itself isn't slowed
+    # down by tracing every call - meanwhile a heartbeat on the loop notices callbacks that hold it up, and blames
+    # whatever the sampler saw running at the time, and the running tasks are counted by coroutine
+    # (asyncio's own debug mode does the slow callback part too, but records a traceback for every callback)
+
+    recent = 2000
+
+    def __init__(self, loop, interval=0.005, slowCallback=0.05, heartbeat=0.02) :
+        self.loop = loop
+        self.interval = interval
+        self.slowCallback = slowCallback
+        self.heartbeat = heartbeat
+
+    async def run(self, seconds) :
+        profile = Profile(seconds, self.interval)
+        timeline = deque(maxlen=self.recent) # (when, stack) of the latest samples
+        lock = threading.Lock()
+        stopping = threading.Event()
+        sampler = threading.Thread(target=self.sample, args=(threading.get_ident(), profile, timeline, lock, stopping), daemon=True)
+        sampler.start()
+
+        try :
+            ends = time.monotonic() + seconds
+            countTasks = 0
+
+            while time.monotonic() < ends :
+                if time.monotonic() >= countTasks :
+                    countTasks = time.monotonic() + 1
+                    profile.taskSamples += 1
+
+                    for task in asyncio.all_tasks(self.loop) :
+                        profile.tasks[self.describe(task)] += 1
+
+                before = time.monotonic()
+                await asyncio.sleep(self.heartbeat)
+                lag = time.monotonic() - before - self.heartbeat
+
+                if lag >= self.slowCallback :
+                    with lock :
+                        stacks = [ stack for when, stack in timeline if when >= before ]
+
+                    profile.slow.append((lag, self.blame(stacks)))
+
+        finally :
+            stopping.set()
+            await self.loop.run_in_executor(None, sampler.join)
+
+        return profile
+
+    def sample(self, thread, profile, timeline, lock, stopping) :
+        while not stopping.wait(self.interval) :
+            frame = sys._current_frames().get(thread)
+
+            if frame is not None :
+                stack = self.collapse(frame)
+                profile.stacks[stack] += 1
+
+                with lock :
+                    timeline.append((time.monotonic(), stack))
+
+    @staticmethod
+    def blame(stacks) :
+        # the callback seen most while the loop was held up, from where the loop ran it
+        callbacks = Counter(stack.split("events.py:Handle._run;", 1)[-1] for stack in stacks if "events.py:Handle._run;" in stack)
+        return callbacks.most_common(1)[0][0] if callbacks else "unknown"
+
+    @staticmethod
+    def collapse(frame) :
+        frames = []
+
+        while frame is not None :
+            code = frame.f_code
+            frames.append("{}:{}".format(os.path.basename(code.co_filename), getattr(code, "co_qualname", code.co_name)))
+            frame = frame.f_back
+
+        return ";".join(reversed(frames))
+
+    @staticmethod
+    def describe(task) :
+        coro = task.get_coro()
+        return getattr(coro, "__qualname__", None) or repr(coro)
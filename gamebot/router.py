@@ -0,0 +1,21 @@
+class Router :
+    # dispatch table keyed on (scope, command), compiled once so each message is only looked up, never re-parsed
+
+    def __init__(self) :
+        self.table = {}
+
+    @classmethod
+    def compile(cls, tables) :
+        router = cls()
+        for scope, handlers in tables.items() :
+            router.register(scope, handlers)
+
+        return router
+
+    def register(self, scope, handlers) :
+        for command, handler in handlers.items() :
+            if handler and (scope, command) not in self.table :
+                self.table[(scope, command)] = handler
+
+    def match(self, scope, command) :
+        return self.table.get((scope, command))
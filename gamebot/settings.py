@@ -0,0 +1,434 @@
+import ast
+import copy
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+class SettingsStore :
+    # storage backend for settings, holds one record per key ("bot" or a guild ID)
+
+    def load(self, key) :
+        raise NotImplementedError
+
+    def save(self, key, value) :
+        raise NotImplementedError
+
+    def saveMany(self, records) :
+        # a None value deletes the record
+        for key, value in records :
+            if value is None :
+                self.delete(key)
+            else :
+                self.save(key, value)
+
+    def delete(self, key) :
+        raise NotImplementedError
+
+    def has(self, key) :
+        return self.load(key) is not None
+
+    def keys(self) :
+        return [ key for key, value in self.items() ]
+
+    def items(self) :
+        raise NotImplementedError
+
+    def compact(self) :
+        pass
+
+    def publishStats(self, cluster, stats) :
+        # only one process can see this store, so stats just live in memory
+        self.stats = { cluster : (time.time(), stats) }
+
+    def readStats(self, since) :
+        return [ stats for cluster, (updated, stats) in getattr(self, "stats", {}).items() if updated >= since ]
+
+    def saveGames(self, records) :
+        # snapshots of running games keyed by channel ID, a None snapshot deletes it - only kept in memory here
+        games = self.__dict__.setdefault("games", {})
+
+        for key, snapshot in records :
+            if snapshot is None :
+                games.pop(key, None)
+            else :
+                games[key] = snapshot
+
+    def loadGames(self) :
+        return dict(getattr(self, "games", {}))
+
+    def savePlayers(self, cluster, records) :
+        # which cluster and game channel each player is in, so a cluster can find the one running a player's game
+        # a None channel removes the player, if they're still down as in that cluster's game
+        players = self.__dict__.setdefault("players", {})
+
+        for user, channel in records :
+            if channel is not None :
+                players[user] = (cluster, channel)
+            elif players.get(user, (None,))[0] == cluster :
+                del players[user]
+
+    def findPlayer(self, user) :
+        # (cluster, channel) of the game a player is in, or None
+        return getattr(self, "players", {}).get(user)
+
+    def clearPlayers(self, cluster) :
+        players = getattr(self, "players", {})
+
+        for user in [ user for user, (c, channel) in players.items() if c == cluster ] :
+            del players[user]
+
+    def forward(self, cluster, user, content) :
+        # a DM from a player for the cluster running their game, DMs all arrive on whichever cluster has shard 0
+        self.__dict__.setdefault("forwarded", []).append((cluster, time.time(), user, content))
+
+    def takeForwarded(self, cluster, since) :
+        # the DMs forwarded to a cluster since it last looked, anything sent before since is dropped
+        forwarded = getattr(self, "forwarded", [])
+        self.forwarded = [ f for f in forwarded if f[0] != cluster ]
+        return [ (user, content) for c, sent, user, content in forwarded if c == cluster and sent >= since ]
+
+    def close(self) :
+        pass
+
+class PickleStore(SettingsStore) :
+    # the original single file format, every save rewrites the whole file
+
+    def __init__(self, path) :
+        self.path = path
+        self.records = None
+
+    def all(self) :
+        if self.records is None :
+            if os.path.isfile(self.path) :
+                with open(self.path, 'rb') as f :
+                    self.records = pickle.load(f)
+            else :
+                self.records = {}
+
+        return self.records
+
+    def load(self, key) :
+        return self.all().get(key)
+
+    def save(self, key, value) :
+        self.all()[key] = value
+        self.write()
+
+    def saveMany(self, records) :
+        for key, value in records :
+            if value is None :
+                self.all().pop(key, None)
+            else :
+                self.all()[key] = value
+
+        self.write()
+
+    def delete(self, key) :
+        self.all().pop(key, None)
+        self.write()
+
+    def has(self, key) :
+        return key in self.all()
+
+    def keys(self) :
+        return list(self.all().keys())
+
+    def items(self) :
+        return list(self.all().items())
+
+    def write(self) :
+        # write to a temporary file first so a crash mid-write can't corrupt the existing settings
+        temp = "{}.tmp".format(self.path)
+        with open(temp, 'wb') as f :
+            pickle.dump(self.all(), f, pickle.HIGHEST_PROTOCOL)
+
+        os.replace(temp, self.path)
+
+class SQLiteStore(SettingsStore) :
+    # one row per record so a change only writes that record, records are only unpickled when loaded
+    # WAL mode lets every process of a sharded deployment share the same database file
+    # each thread has its own connection, so writes on the bot's store thread (which can wait on another process's
+    # lock) never hold up reads on the event loop, and never share a transaction with them
+
+    def __init__(self, path) :
+        self.path = path
+        self.local = threading.local()
+        self.connections = []
+        db = self.db
+        db.execute("CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value BLOB NOT NULL)")
+        db.execute("CREATE TABLE IF NOT EXISTS clusters (cluster INTEGER PRIMARY KEY, updated REAL NOT NULL, stats BLOB NOT NULL)")
+        db.execute("CREATE TABLE IF NOT EXISTS games (channel INTEGER PRIMARY KEY, updated REAL NOT NULL, snapshot BLOB NOT NULL)")
+        db.execute("CREATE TABLE IF NOT EXISTS players (user INTEGER PRIMARY KEY, cluster INTEGER NOT NULL, channel INTEGER NOT NULL)")
+        db.execute("CREATE TABLE IF NOT EXISTS forwarded (id INTEGER PRIMARY KEY AUTOINCREMENT, cluster INTEGER NOT NULL, sent REAL NOT NULL, user INTEGER NOT NULL, content TEXT NOT NULL)")
+        db.commit()
+
+    @property
+    def db(self) :
+        db = getattr(self.local, "db", None)
+
+        if db is None :
+            db = self.local.db = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self.connections.append(db)
+
+        return db
+
+    @staticmethod
+    def encodeKey(key) :
+        return repr(key)
+
+    @staticmethod
+    def decodeKey(key) :
+        return ast.literal_eval(key)
+
+    def load(self, key) :
+        row = self.db.execute("SELECT value FROM settings WHERE key = ?", (self.encodeKey(key),)).fetchone()
+        return pickle.loads(row[0]) if row else None
+
+    def save(self, key, value) :
+        with self.db :
+            self.db.execute(
+                "INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)",
+                (self.encodeKey(key), pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+            )
+
+    def saveMany(self, records) :
+        with self.db :
+            self.db.executemany(
+                "INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)",
+                [ (self.encodeKey(key), pickle.dumps(value, pickle.HIGHEST_PROTOCOL)) for key, value in records if value is not None ]
+            )
+            self.db.executemany(
+                "DELETE FROM settings WHERE key = ?",
+                [ (self.encodeKey(key),) for key, value in records if value is None ]
+            )
+
+    def delete(self, key) :
+        with self.db :
+            self.db.execute("DELETE FROM settings WHERE key = ?", (self.encodeKey(key),))
+
+    def has(self, key) :
+        return self.db.execute("SELECT 1 FROM settings WHERE key = ?", (self.encodeKey(key),)).fetchone() is not None
+
+    def keys(self) :
+        return [ self.decodeKey(k) for (k,) in self.db.execute("SELECT key FROM settings") ]
+
+    def items(self) :
+        return [ (self.decodeKey(k), pickle.loads(v)) for k, v in self.db.execute("SELECT key, value FROM settings") ]
+
+    def compact(self) :
+        # keeps the WAL file from growing - no VACUUM, it locks the whole database for every process while it runs
+        self.db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def publishStats(self, cluster, stats) :
+        with self.db :
+            self.db.execute(
+                "INSERT OR REPLACE INTO clusters (cluster, updated, stats) VALUES (?, ?, ?)",
+                (cluster, time.time(), pickle.dumps(stats, pickle.HIGHEST_PROTOCOL))
+            )
+
+    def readStats(self, since) :
+        return [ pickle.loads(v) for (v,) in self.db.execute("SELECT stats FROM clusters WHERE updated >= ?", (since,)) ]
+
+    def saveGames(self, records) :
+        now = time.time()
+
+        with self.db :
+            self.db.executemany(
+                "INSERT OR REPLACE INTO games (channel, updated, snapshot) VALUES (?, ?, ?)",
+                [ (key, now, pickle.dumps(snapshot, pickle.HIGHEST_PROTOCOL)) for key, snapshot in records if snapshot is not None ]
+            )
+            self.db.executemany(
+                "DELETE FROM games WHERE channel = ?",
+                [ (key,) for key, snapshot in records if snapshot is None ]
+            )
+
+    def loadGames(self) :
+        return { key : pickle.loads(v) for key, v in self.db.execute("SELECT channel, snapshot FROM games") }
+
+    def savePlayers(self, cluster, records) :
+        with self.db :
+            self.db.executemany(
+                "INSERT OR REPLACE INTO players (user, cluster, channel) VALUES (?, ?, ?)",
+                [ (user, cluster, channel) for user, channel in records if channel is not None ]
+            )
+            self.db.executemany(
+                "DELETE FROM players WHERE user = ? AND cluster = ?",
+                [ (user, cluster) for user, channel in records if channel is None ]
+            )
+
+    def findPlayer(self, user) :
+        return self.db.execute("SELECT cluster, channel FROM players WHERE user = ?", (user,)).fetchone()
+
+    def clearPlayers(self, cluster) :
+        with self.db :
+            self.db.execute("DELETE FROM players WHERE cluster = ?", (cluster,))
+
+    def forward(self, cluster, user, content) :
+        with self.db :
+            self.db.execute("INSERT INTO forwarded (cluster, sent, user, content) VALUES (?, ?, ?, ?)", (cluster, time.time(), user, content))
+
+    def takeForwarded(self, cluster, since) :
+        with self.db :
+            rows = self.db.execute("SELECT id, sent, user, content FROM forwarded WHERE cluster = ? ORDER BY id", (cluster,)).fetchall()
+
+            if rows :
+                self.db.execute("DELETE FROM forwarded WHERE cluster = ? AND id <= ?", (cluster, rows[-1][0]))
+
+        return [ (user, content) for id, sent, user, content in rows if sent >= since ]
+
+    def close(self) :
+        for db in self.connections :
+            db.close()
+
+        self.connections = []
+        self.local = threading.local()
+
+def migrate(source, target) :
+    # copy every record from one store into another, used to move off the old pickle file
+    for key, value in source.items() :
+        target.save(key, value)
+
+class Settings :
+    # dict-like view over a store, records are loaded the first time they're used into a bounded LRU cache
+    # changed records are marked dirty, and only flush() writes to the store - evicted and deleted records wait in
+    # pending until it does, so the bot can flush on a worker thread with every write still going out in order
+
+    def __init__(self, store, capacity=1024, pinned=("bot",)) :
+        self.store = store
+        self.capacity = capacity
+        self.pinned = set(pinned)
+        self.records = OrderedDict()
+        self.dirty = set()
+        self.missing = set()
+        self.pending = {} # key -> copy of a record to write, or None to delete it - kept until it's been written
+
+    def __getitem__(self, key) :
+        if key in self.records :
+            self.records.move_to_end(key)
+            return self.records[key]
+
+        if key in self.pending :
+            # not written yet, or being written, the store would give back what was there before
+            value = copy.deepcopy(self.pending[key])
+
+            if value is not None :
+                self.cache(key, value)
+                self.dirty.add(key)
+                return value
+
+        value = self.store.load(key) if key not in self.missing and key not in self.pending else None
+
+        if value is None :
+            self.markMissing(key)
+            raise KeyError(key)
+
+        self.cache(key, value)
+        return value
+
+    def __setitem__(self, key, value) :
+        self.missing.discard(key)
+        self.cache(key, value)
+        self.save(key)
+
+    def __delitem__(self, key) :
+        self.records.pop(key, None)
+        self.dirty.discard(key)
+        self.markMissing(key)
+        self.pending[key] = None
+
+    def __contains__(self, key) :
+        try :
+            self[key]
+            return True
+        except KeyError :
+            return False
+
+    def refresh(self, key) :
+        # reload a record changed by another process, unless there are local changes still to write
+        if key in self.records and key not in self.dirty and key not in self.pending :
+            value = self.store.load(key)
+
+            if value is not None :
+                self.records[key] = value
+
+    def known(self, key) :
+        # check a record exists without loading it
+        if key in self.records :
+            return True
+
+        if key in self.pending :
+            return self.pending[key] is not None
+
+        return key not in self.missing and self.store.has(key)
+
+    def keys(self) :
+        deleted = { key for key, value in self.pending.items() if value is None }
+        return set(self.records) | (set(self.pending) - deleted) | (set(self.store.keys()) - deleted)
+
+    def __repr__(self) :
+        return repr(dict(self.records))
+
+    def cache(self, key, value) :
+        self.records[key] = value
+        self.records.move_to_end(key)
+
+        while len(self.records) > self.capacity :
+            evict = next((k for k in self.records if k not in self.pinned), None)
+
+            if evict is None :
+                break
+
+            if evict in self.dirty :
+                self.pending[evict] = copy.deepcopy(self.records[evict])
+                self.dirty.discard(evict)
+
+            del self.records[evict]
+
+    def markMissing(self, key) :
+        if len(self.missing) >= self.capacity :
+            self.missing.clear()
+
+        self.missing.add(key)
+
+    def save(self, key) :
+        if key in self.records :
+            self.dirty.add(key)
+
+    def collect(self) :
+        # copies of the changed records, so they can be written while the bot carries on changing the originals
+        dirty, self.dirty = self.dirty, set()
+
+        for key in dirty :
+            if key in self.records :
+                self.pending[key] = copy.deepcopy(self.records[key])
+
+        return list(self.pending.items())
+
+    def written(self, records) :
+        for key, value in records :
+            if key in self.pending and self.pending[key] is value :
+                del self.pending[key]
+
+    def flush(self) :
+        records = self.collect()
+
+        if records :
+            self.store.saveMany(records)
+            self.written(records)
+
+    async def write(self, loop, executor) :
+        # flush() with the store's side on the executor, the event loop only copies the changed records
+        records = self.collect()
+
+        if records :
+            await loop.run_in_executor(executor, self.store.saveMany, records)
+            self.written(records)
+
+    def close(self) :
+        self.flush()
+        self.store.close()
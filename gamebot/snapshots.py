@@ -0,0 +1,33 @@
+class Snapshots :
+    # write-behind buffer for game snapshots, a game's latest snapshot replaces any still waiting to be written
+    # so however often a game changes it costs at most one write per flush
+
+    def __init__(self, store) :
+        self.store = store
+        self.pending = {} # channel ID -> snapshot, or None to delete it
+
+    def __len__(self) :
+        return len(self.pending)
+
+    def save(self, key, snapshot) :
+        self.pending[key] = snapshot
+
+    def delete(self, key) :
+        self.pending[key] = None
+
+    def flush(self) :
+        pending, self.pending = self.pending, {}
+
+        if pending :
+            self.store.saveGames(list(pending.items()))
+
+    async def write(self, loop, executor) :
+        # snapshots are made fresh every time, so they can be written on the executor as they are
+        pending, self.pending = self.pending, {}
+
+        if pending :
+            await loop.run_in_executor(executor, self.store.saveGames, list(pending.items()))
+
+    def load(self) :
+        self.flush()
+        return self.store.loadGames()
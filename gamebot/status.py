@@ -0,0 +1,67 @@
+import discord
+
+class StatusMessage :
+    # one message kept up to date in place, pinned when the bot is allowed to
+    # updates are debounced so a burst of changes costs a single edit at most once per window
+
+    def __init__(self, timers, worker, channel, render, window=2) :
+        # render returns the embed to show, it's only called when the edit actually goes out
+        self.timers = timers
+        self.worker = worker
+        self.channel = channel
+        self.render = render
+        self.window = window
+        self.message = None
+        self.pending = False
+
+    @property
+    def key(self) :
+        return ("status", self.channel.id)
+
+    def update(self) :
+        if not self.pending :
+            self.pending = True
+            self.timers.set(self.key, self.window, self.worker.submit, self.refresh)
+
+    async def refresh(self) :
+        self.timers.cancel(self.key)
+        self.pending = False
+        embed = self.render()
+
+        if self.message is not None :
+            try :
+                await self.message.edit(embed=embed)
+                return
+
+            except discord.errors.NotFound :
+                # someone deleted it, post it again
+                self.message = None
+
+        self.message = await self.channel.send(embed=embed)
+
+        try :
+            await self.message.pin()
+        except discord.errors.HTTPException :
+            pass
+
+    async def current(self) :
+        # the message as it should be right now, only edited (or sent) if there's an update waiting for it
+        if self.pending or self.message is None :
+            await self.refresh()
+
+        return self.message
+
+    async def close(self, delete=False) :
+        self.timers.cancel(self.key)
+        self.pending = False
+        message, self.message = self.message, None
+
+        if message is not None :
+            try :
+                await (message.delete() if delete else message.unpin())
+            except discord.errors.HTTPException :
+                pass
+
+    def stop(self) :
+        self.timers.cancel(self.key)
+        self.pending = False
@@ -0,0 +1,59 @@
+from collections import OrderedDict
+
+import discord
+
+class Templates :
+    # a locale's strings with the per-guild values (e.g. the prefix) already filled in, plus the static embeds built
+    # from them - shared by every game with the same locale and values, so changing the prefix just picks another set
+
+    capacity = 64
+    cache = OrderedDict()
+
+    @classmethod
+    def get(cls, strings, locale, **values) :
+        key = (id(strings), locale, tuple(sorted(values.items())))
+
+        if key in cls.cache :
+            cls.cache.move_to_end(key)
+        else :
+            cls.cache[key] = cls({ **strings["en"], **strings.get(locale, {}) }, values)
+
+            while len(cls.cache) > cls.capacity :
+                cls.cache.popitem(last=False)
+
+        return cls.cache[key]
+
+    def __init__(self, strings, values) :
+        self.strings = {}
+        self.formats = {} # the same, with braces in the values escaped so format() leaves them alone
+        self.embeds = {}
+
+        for name, text in strings.items() :
+            formatted = text
+
+            for k, v in values.items() :
+                text = text.replace("{" + k + "}", str(v))
+                formatted = formatted.replace("{" + k + "}", str(v).replace("{", "{{").replace("}", "}}"))
+
+            self.strings[name] = text
+            self.formats[name] = formatted
+
+    def __getitem__(self, name) :
+        return self.strings[name]
+
+    def format(self, key, **values) :
+        return self.formats[key].format(**values)
+
+    def embed(self, name, colour, title=None) :
+        # built once and shared, copy() it before changing anything
+        key = (name, colour, title)
+
+        if key not in self.embeds :
+            embed = discord.Embed(description=self.strings[name], colour=colour)
+
+            if title :
+                embed.title = self.strings[title]
+
+            self.embeds[key] = embed
+
+        return self.embeds[key]
@@ -0,0 +1,97 @@
+import asyncio
+import heapq
+import itertools
+
+class Timers :
+    # one heap of deadlines shared by every game, run by a single task that sleeps until the next one is due
+    # setting a key again replaces its deadline, replaced and cancelled entries are skipped when they come up
+    # pushing back a deadline (e.g. the idle timer, on every lobby command) leaves the heap alone, the entry is queued
+    # again for its new deadline once the old one comes up - and once stale entries outnumber live ones the heap is
+    # rebuilt, so it can't keep growing
+
+    def __init__(self, loop, onError=None) :
+        self.loop = loop
+        self.onError = onError
+        self.heap = []
+        self.entries = {} # key -> (when, sequence, callback, args, when it's queued in the heap for)
+        self.sequence = itertools.count()
+        self.wakeup = asyncio.Event()
+        self.task = None
+
+    def __len__(self) :
+        return len(self.entries)
+
+    def set(self, key, delay, callback, *args) :
+        when = self.loop.time() + delay
+        current = self.entries.get(key)
+
+        if current and current[4] <= when :
+            # it'll come up in the heap first, and be queued again then
+            self.entries[key] = (when, current[1], callback, args, current[4])
+            return
+
+        entry = (when, next(self.sequence), callback, args, when)
+        self.entries[key] = entry
+        heapq.heappush(self.heap, (when, entry[1], key))
+
+        if len(self.heap) > 2 * len(self.entries) + 16 :
+            self.compact()
+
+        if not self.task or self.task.done() :
+            self.task = self.loop.create_task(self.run())
+        elif when <= self.heap[0][0] :
+            self.wakeup.set()
+
+    def cancel(self, key) :
+        self.entries.pop(key, None)
+
+    def compact(self) :
+        self.heap = [ (entry[4], entry[1], key) for key, entry in self.entries.items() ]
+        heapq.heapify(self.heap)
+
+    async def run(self) :
+        while True :
+            self.wakeup.clear()
+            now = self.loop.time()
+
+            while self.heap and self.heap[0][0] <= now :
+                when, sequence, key = heapq.heappop(self.heap)
+                entry = self.entries.get(key)
+
+                if entry and entry[1] == sequence :
+                    if entry[0] > now :
+                        # pushed back since it was queued
+                        self.entries[key] = entry[:4] + (entry[0],)
+                        heapq.heappush(self.heap, (entry[0], sequence, key))
+                        continue
+
+                    del self.entries[key]
+
+                    try :
+                        entry[2](*entry[3])
+
+                    except Exception as e :
+                        # one bad callback can't be allowed to stop every other game's timers
+                        if self.onError :
+                            self.onError(e)
+                        else :
+                            raise
+
+            if not self.entries :
+                # only stale entries are left, they'd never fire
+                self.heap.clear()
+
+            timeout = (self.heap[0][0] - now) if self.heap else None
+
+            try :
+                await asyncio.wait_for(self.wakeup.wait(), timeout)
+            except asyncio.TimeoutError :
+                pass
+
+    def stop(self) :
+        self.entries.clear()
+        self.heap.clear()
+
+        if self.task :
+            self.task.cancel()
+            self.task = None
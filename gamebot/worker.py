@@ -0,0 +1,51 @@
+import asyncio
+import collections
+
+class Worker :
+    # runs submitted coroutines one at a time in submission order on its own task, so whoever submits never waits on them
+    # the task only exists while there's work queued, idle workers cost nothing but the queue
+
+    def __init__(self, loop, onError=None) :
+        self.loop = loop
+        self.onError = onError
+        self.queue = collections.deque()
+        self.task = None
+
+    def __len__(self) :
+        return len(self.queue)
+
+    def submit(self, coroutine, *args, **kwargs) :
+        self.queue.append((coroutine, args, kwargs))
+
+        if not self.task :
+            self.task = self.loop.create_task(self.run())
+
+    async def run(self) :
+        try :
+            while self.queue :
+                coroutine, args, kwargs = self.queue.popleft()
+
+                try :
+                    await coroutine(*args, **kwargs)
+
+                except Exception as e :
+                    if self.onError :
+                        self.onError(e)
+                    else :
+                        raise
+
+        finally :
+            if self.task is asyncio.current_task() :
+                self.task = None
+
+    async def join(self) :
+        # wait until everything submitted so far, and anything it submits in turn, has run
+        while self.task :
+            await asyncio.wait([ self.task ])
+
+    def stop(self) :
+        self.queue.clear()
+
+        if self.task :
+            self.task.cancel()
+            self.task = None
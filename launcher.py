@@ -0,0 +1,45 @@
+#!/usr/bin/python3
+# runs the bot as several processes (clusters), each connecting a share of the shards
+import argparse
+import multiprocessing
+
+from credentials import discordToken
+
+
+def runCluster(cluster, shardIDs, shardCount):
+    from mafia import Mafia
+
+    m = Mafia(cluster=cluster, shard_ids=shardIDs, shard_count=shardCount)
+    m.run(discordToken)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Run MafiaBot across several processes"
+    )
+    parser.add_argument(
+        "--shards", type=int, required=True, help="total number of shards"
+    )
+    parser.add_argument(
+        "--clusters",
+        type=int,
+        default=1,
+        help="number of processes to split the shards between",
+    )
+    options = parser.parse_args()
+
+    context = multiprocessing.get_context("spawn")
+    processes = []
+
+    for cluster in range(options.clusters):
+        shardIDs = list(range(cluster, options.shards, options.clusters))
+        process = context.Process(
+            target=runCluster,
+            args=(cluster, shardIDs, options.shards),
+            name="cluster-{}".format(cluster),
+        )
+        process.start()
+        processes.append(process)
+
+    for process in processes:
+        process.join()
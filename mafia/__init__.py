@@ -2,6 +2,7 @@ from gamebot import GameBot
 from gamebot.decorators import guard
 
 from mafia.game import Game, commands
+from mafia.pool import ChannelPool
 
 
 class Mafia(GameBot):
@@ -9,36 +10,83 @@ class Mafia(GameBot):
     name = "MafiaBot"
     activity = "Mafia"
     contact = "owen@owenjones.net"
-    persist = "mafiabot.pickle"
+    persist = "mafiabot.db"
+    legacyPersist = "mafiabot.pickle"
 
     handlers = {"mafia": "mafia", "destroy": "destroy"}
 
-    mafiaChannels = {}
+    timeoutPhases = tuple(Game.timeouts)
 
     permissions = {
-        "category": ["in_category", "manage_channel"],
+        # the bot gives itself manage messages and read message history on the mafia channel, to clear it out for
+        # the next game, and can only grant permissions it already has
+        "category": [
+            "in_category",
+            "manage_channels",
+            "manage_roles",
+            "manage_messages",
+            "read_message_history",
+        ],
         "channel": ["read_messages", "send_messages", "embed_links"],
     }
 
+    def __init__(self, **options):
+        super().__init__(**options)
+        self.mafiaChannels = {}
+        self.channelPool = ChannelPool()
+
+    async def reclaim(self):
+        await self.channelPool.reclaim()
+
+    def restoreGame(self, channel, snapshot):
+        return Game.restore(self, channel, snapshot)
+
+    async def reconcile(self):
+        # mafia channels left behind by games that weren't restored go back in the pool
+        for guild in self.guilds:
+            for channel in guild.text_channels:
+                if channel.id not in self.mafiaChannels and self.isMafiaChannel(
+                    channel
+                ):
+                    await self.channelPool.release(channel)
+
+    def isMafiaChannel(self, channel):
+        # only channels set up the way makeMafiaChannel does it, not just any with the same name
+        return (
+            channel.name == self.channelPool.name
+            and channel.overwrites_for(channel.guild.default_role).read_messages
+            is False
+            and channel.overwrites_for(channel.guild.me).manage_channels is True
+        )
+
+    def canMakeMafiaChannel(self, channel):
+        # checked before a game starts rather than finding out when the mafia channel can't be made
+        return channel.category is not None and not self.checkCategoryPermissions(
+            channel
+        )
+
     # forward message to game predicate
 
     @guard.onlyActiveChannel
     async def mafia(self, message, args):
         if not message.channel.id in self.active:
+            if not self.canMakeMafiaChannel(message.channel):
+                await message.channel.send(
+                    ":exploding_head: I can't start a game here because I need the `Manage Channels`, `Manage Permissions`, `Manage Messages` and `Read Message History` permissions in this channel category to make the mafia's channel"
+                )
+                return
+
             self.active[message.channel.id] = {
                 "guild": message.guild.id,
-                "game": Game(self, message),
+                "game": Game(self, message.channel),
             }
 
             await self.active[message.channel.id]["game"].launch(message)
+            self.updatePresenceCount()
 
         else:
             await self.active[message.channel.id]["game"].on_message(message)
 
     @guard.onlyActiveChannel
     async def destroy(self, message, args):
-        if message.channel.id in self.active:
-            await self.active[message.channel.id]["game"].destroy()
-            del self.active[message.channel.id]["game"]
-            del self.active[message.channel.id]
-            await message.channel.send("The game was destroyed!")
+        await self.closeGame(message.channel.id, "The game was destroyed!")
@@ -0,0 +1,585 @@
+import math
+import random
+from enum import Enum
+
+from mafia.tally import Tally
+
+
+class State(Enum):
+    START = 1
+    ROUNDSLEEP = 2
+    ROUNDPURGE = 3
+    END = 4
+
+
+class Win(Enum):
+    VILLAGERS = 1
+    MAFIA = 2
+
+
+class Role(Enum):
+    UNASSIGNED = 0
+    MAFIA = 1
+    DOCTOR = 2
+    DETECTIVE = 3
+    VILLAGER = 4
+
+
+class Event(Enum):
+    JOINED = 1
+    LEFT = 2
+    NOT_ENOUGH_PLAYERS = 3
+    ROLES_ALLOCATED = 4
+    ROUND_STARTED = 5
+    CHOICE_SUBMITTED = 6
+    CHOICE_INVALID = 7
+    SAVE_REPEATED = 8
+    MARKED = 9
+    NO_AGREEMENT = 10
+    NIGHT_SUMMARY = 11
+    KILLED = 12
+    PURGE_STARTED = 13
+    ACCUSED = 14
+    ACCUSE_INVALID = 15
+    NOT_IN_GAME = 16
+    SKIPPED = 17
+    PURGE_AGREED = 18
+    PURGE_NO_AGREEMENT = 19
+    GAME_ENDED = 20
+    RESTARTED = 21
+    TIMED_OUT = 22
+    FULL = 23
+
+
+class Engine:
+    # the rules of the game as a synchronous state machine, with no Discord I/O
+    # players are user IDs, each action returns the list of (Event, data) it caused for an adapter to render
+    # players is the seat order (what the numbers in choose refer to), roles maps each seated user ID to their Role
+
+    __slots__ = (
+        "seed",
+        "rng",
+        "events",
+        "players",
+        "roles",
+        "nMafia",
+        "nVillagers",
+        "doctor",
+        "detective",
+        "round",
+        "mafiaChoose",
+        "roundKill",
+        "roundKillSkip",
+        "roundSave",
+        "lastRoundSave",
+        "roundDetect",
+        "roundPurge",
+        "state",
+    )
+
+    minPlayers = 5
+    maxPlayers = 15
+
+    # one mafia member per this many players (plus one) once there are more than this many players
+    mafiaRatio = 5
+
+    def __init__(self, seed=None):
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.events = []
+        self.reset()
+
+    def reset(self):
+        self.players = []
+        self.roles = {}
+        self.nMafia = 0
+        self.nVillagers = 0
+        self.doctor = None
+        self.detective = None
+        self.round = 1
+        self.mafiaChoose = Tally()
+        self.roundKill = None
+        self.roundKillSkip = None
+        self.roundSave = None
+        self.lastRoundSave = None
+        self.roundDetect = None
+        self.roundPurge = Tally()
+        self.state = State.START
+
+    def emit(self, kind, **data):
+        self.events.append((kind, data))
+
+    def drain(self):
+        events, self.events = self.events, []
+        return events
+
+    # Snapshots
+    # the plain values that make up a game, to carry it on after a restart - JSON safe, so the game log can keep them
+    # the rng isn't kept - a restored game only needs it again to deal roles for a restart, and reseeding it with the
+    # original seed would deal those the same as the first game, so restore takes a new seed
+    fields = (
+        "players",
+        "nMafia",
+        "nVillagers",
+        "doctor",
+        "detective",
+        "round",
+        "roundKill",
+        "roundKillSkip",
+        "roundSave",
+        "lastRoundSave",
+        "roundDetect",
+    )
+
+    def snapshot(self):
+        snapshot = {name: getattr(self, name) for name in self.fields}
+        snapshot["players"] = list(self.players)
+        snapshot["seed"] = self.seed
+        snapshot["roles"] = [[p, r.value] for p, r in self.roles.items()]
+        snapshot["mafiaChoose"] = self.mafiaChoose.snapshot()
+        snapshot["roundPurge"] = self.roundPurge.snapshot()
+        snapshot["state"] = self.state.value
+        return snapshot
+
+    @classmethod
+    def restore(cls, snapshot, seed=None):
+        engine = cls(snapshot["seed"] if seed is None else seed)
+
+        for name in cls.fields:
+            setattr(engine, name, snapshot[name])
+
+        engine.players = list(snapshot["players"])
+        engine.roles = {p: Role(r) for p, r in snapshot["roles"]}
+        engine.mafiaChoose = Tally.restore(snapshot["mafiaChoose"])
+        engine.roundPurge = Tally.restore(snapshot["roundPurge"])
+        engine.state = State(snapshot["state"])
+        return engine
+
+    # Queries
+    @property
+    def mafia(self):
+        return [p for p in self.players if self.roles[p] is Role.MAFIA]
+
+    @property
+    def villagers(self):
+        return [p for p in self.players if self.roles[p] is not Role.MAFIA]
+
+    def hasPlayer(self, player):
+        return player in self.roles
+
+    def roleOf(self, player):
+        return self.roles.get(player)
+
+    def waitingFor(self):
+        # roles still to choose at night, or players still to vote during the day
+        if self.state == State.ROUNDSLEEP:
+            waiting = []
+
+            if not (self.roundKill is not None or self.roundKillSkip):
+                waiting.append(Role.MAFIA)
+
+            if self.doctor is not None and self.roundSave is None:
+                waiting.append(Role.DOCTOR)
+
+            if self.detective is not None and self.roundDetect is None:
+                waiting.append(Role.DETECTIVE)
+
+            return waiting
+
+        elif self.state == State.ROUNDPURGE:
+            return [p for p in self.players if p in self.roundPurge.pending]
+
+        return []
+
+    def tally(self):
+        # the vote in progress, if there is one
+        if self.state == State.ROUNDSLEEP:
+            return self.mafiaChoose
+        elif self.state == State.ROUNDPURGE:
+            return self.roundPurge
+
+        return None
+
+    def votes(self):
+        # how many votes each choice has in the vote in progress
+        tally = self.tally()
+        return dict(tally.counts) if tally is not None else {}
+
+    def checkWinConditions(self):
+        if self.nMafia >= self.nVillagers:
+            return Win.MAFIA
+        elif self.nMafia == 0:
+            return Win.VILLAGERS
+        else:
+            return False
+
+    # Actions
+    @property
+    def full(self):
+        return len(self.players) >= self.maxPlayers
+
+    def join(self, player):
+        if self.state == State.START and not self.hasPlayer(player):
+            if self.full:
+                self.emit(Event.FULL, player=player, count=len(self.players))
+            else:
+                self.players.append(player)
+                self.roles[player] = Role.UNASSIGNED
+                self.emit(Event.JOINED, player=player, count=len(self.players))
+
+        return self.drain()
+
+    def leave(self, player):
+        if self.hasPlayer(player):
+            self.emit(Event.LEFT, player=player)
+
+            if self.state in [State.ROUNDSLEEP, State.ROUNDPURGE]:
+                self.kill(player)
+                win = self.checkWinConditions()
+
+                if win:
+                    self.endGame(win)
+                else:
+                    # whoever left might have been the last one the night was waiting on
+                    self.testRoundContinue()
+
+            else:
+                self.removePlayer(player)
+
+        return self.drain()
+
+    def start(self, player):
+        if self.state == State.START and self.hasPlayer(player):
+            if len(self.players) < self.minPlayers:
+                self.emit(
+                    Event.NOT_ENOUGH_PLAYERS,
+                    count=len(self.players),
+                    needed=self.minPlayers,
+                )
+
+            else:
+                self.allocateRoles()
+                self.emit(
+                    Event.ROLES_ALLOCATED,
+                    players=list(self.players),
+                    mafia=self.mafia,
+                    doctor=self.doctor,
+                    detective=self.detective,
+                )
+                self.startRound()
+
+        return self.drain()
+
+    def choose(self, player, number):
+        if self.state != State.ROUNDSLEEP:
+            return self.drain()
+
+        valid = bool(number) and 0 < number <= len(self.players)
+
+        role = self.roles.get(player)
+
+        if role is Role.MAFIA:
+            # the mafia can change their minds until they've agreed or everyone has chosen
+            if number and self.roundKill is None and not self.roundKillSkip:
+                if not valid:
+                    self.emit(Event.CHOICE_INVALID, player=player, role=Role.MAFIA)
+                else:
+                    self.mafiaChoose.vote(player, self.players[number - 1])
+                    self.emit(Event.CHOICE_SUBMITTED, player=player, role=Role.MAFIA)
+                    self.testMafiaChoice()
+
+        elif role is Role.DOCTOR:
+            if valid:
+                save = self.players[number - 1]
+                if save != self.lastRoundSave:
+                    self.roundSave = save
+                    self.emit(
+                        Event.CHOICE_SUBMITTED,
+                        player=player,
+                        role=Role.DOCTOR,
+                        target=save,
+                    )
+                else:
+                    self.emit(Event.SAVE_REPEATED, player=player)
+            else:
+                self.emit(Event.CHOICE_INVALID, player=player, role=Role.DOCTOR)
+
+        elif role is Role.DETECTIVE:
+            if valid:
+                self.roundDetect = self.players[number - 1]
+                self.emit(
+                    Event.CHOICE_SUBMITTED,
+                    player=player,
+                    role=Role.DETECTIVE,
+                    target=self.roundDetect,
+                )
+            else:
+                self.emit(Event.CHOICE_INVALID, player=player, role=Role.DETECTIVE)
+
+        self.testRoundContinue()
+        return self.drain()
+
+    def accuse(self, player, target):
+        if self.state == State.ROUNDPURGE and self.hasPlayer(player):
+            if target is None:
+                self.emit(Event.ACCUSE_INVALID, player=player)
+
+            elif not self.hasPlayer(target):
+                self.emit(Event.NOT_IN_GAME, player=player, target=target)
+
+            else:
+                self.roundPurge.vote(player, target)
+                self.emit(
+                    Event.ACCUSED,
+                    player=player,
+                    target=target,
+                    left=len(self.roundPurge.pending),
+                    votes=self.roundPurge.counts[target],
+                )
+                self.testPurge()
+
+        return self.drain()
+
+    def skip(self, player):
+        if self.state == State.ROUNDPURGE and self.hasPlayer(player):
+            self.roundPurge.vote(player, False)
+            self.emit(
+                Event.SKIPPED,
+                player=player,
+                left=len(self.roundPurge.pending),
+            )
+            self.testPurge()
+
+        return self.drain()
+
+    def restart(self):
+        if self.state == State.END:
+            self.reset()
+            self.emit(Event.RESTARTED)
+
+        return self.drain()
+
+    def timeout(self):
+        # time's up for the current phase, settle it with whatever has been chosen so far
+        if self.state == State.ROUNDSLEEP:
+            self.emit(Event.TIMED_OUT, state=self.state)
+
+            if self.roundKill is None and not self.roundKillSkip:
+                if self.mafiaChoose.votes and self.mafiaChoose.hasMajorityOfVotes():
+                    self.roundKill = self.mafiaChoose.leader
+                    self.emit(Event.MARKED, target=self.roundKill)
+                else:
+                    self.roundKillSkip = True
+                    self.emit(Event.NO_AGREEMENT)
+
+            self.summariseRound()
+
+        elif self.state == State.ROUNDPURGE:
+            self.emit(Event.TIMED_OUT, state=self.state)
+
+            if self.roundPurge.votes:
+                self.purge()
+            elif (
+                not self.mafiaChoose.votes
+                and self.roundSave is None
+                and self.roundDetect is None
+            ):
+                # nobody has done anything for a whole round, the game's been abandoned
+                self.endGame()
+            else:
+                self.emit(Event.PURGE_NO_AGREEMENT)
+                self.continueGame()
+
+        return self.drain()
+
+    def end(self, win=False):
+        # stop the game early, e.g. when the adapter can't carry on
+        if self.state != State.END:
+            self.endGame(win)
+
+        return self.drain()
+
+    # Game Helpers
+    def removePlayer(self, player):
+        self.players.remove(player)
+        del self.roles[player]
+
+        # their votes go, and anyone who voted for them has to choose again
+        for tally in [self.mafiaChoose, self.roundPurge]:
+            tally.remove(player)
+            tally.withdraw(player)
+
+    def allocateRoles(self):
+        nMafia = (
+            1
+            if len(self.players) <= self.mafiaRatio
+            else (math.floor(len(self.players) / self.mafiaRatio) + 1)
+        )
+
+        self.rng.shuffle(self.players)
+
+        for n, p in enumerate(self.players):
+            self.roles[p] = Role.MAFIA if n < nMafia else Role.VILLAGER
+
+        self.nMafia = nMafia
+        self.nVillagers = len(self.players) - nMafia
+
+        self.doctor = self.players[nMafia]
+        self.roles[self.doctor] = Role.DOCTOR
+
+        if len(self.players) > 5:
+            self.detective = self.players[nMafia + 1]
+            self.roles[self.detective] = Role.DETECTIVE
+
+        self.rng.shuffle(self.players)
+
+    def kill(self, player, purge=False):
+        role = self.roles.get(player)
+
+        if role is None or role is Role.UNASSIGNED:
+            return
+
+        if role is Role.MAFIA:
+            self.nMafia -= 1
+        else:
+            self.nVillagers -= 1
+
+            if role is Role.DOCTOR:
+                self.doctor = None
+            elif role is Role.DETECTIVE:
+                self.detective = None
+
+        self.removePlayer(player)
+        self.emit(Event.KILLED, player=player, role=role, purged=purge)
+
+    # Round Flow
+    def startRound(self):
+        self.state = State.ROUNDSLEEP
+        self.mafiaChoose = Tally(self.mafia)
+        self.emit(
+            Event.ROUND_STARTED,
+            round=self.round,
+            players=list(self.players),
+            doctor=self.doctor,
+            detective=self.detective,
+        )
+
+    def continueGame(self):
+        self.lastRoundSave = self.roundSave
+        self.roundKill = None
+        self.roundKillSkip = None
+        self.roundSave = None
+        self.roundDetect = None
+        self.roundPurge = Tally()
+
+        self.round += 1
+        self.startRound()
+
+    def endGame(self, win=False):
+        self.state = State.END
+
+        if win == Win.VILLAGERS:
+            winners = list(self.villagers)
+        elif win == Win.MAFIA:
+            winners = list(self.mafia)
+        else:
+            winners = []
+
+        self.emit(Event.GAME_ENDED, win=win, winners=winners)
+
+    def testMafiaChoice(self):
+        # a majority of the mafia marks someone straight away, otherwise it's decided once they've all chosen
+        if self.roundKill is not None or self.roundKillSkip:
+            return
+
+        if self.mafiaChoose.hasMajority():
+            self.roundKill = self.mafiaChoose.leader
+            self.emit(Event.MARKED, target=self.roundKill)
+        elif self.mafiaChoose.complete and len(self.mafiaChoose):
+            self.roundKillSkip = True
+            self.emit(Event.NO_AGREEMENT)
+
+    def testRoundContinue(self):
+        if self.state == State.ROUNDSLEEP:
+            # whoever left might have changed what the mafia need to agree
+            self.testMafiaChoice()
+
+        elif self.state == State.ROUNDPURGE:
+            self.testPurge()
+            return
+
+        if (
+            (self.state == State.ROUNDSLEEP)
+            and (self.roundKill is not None or self.roundKillSkip)
+            and (self.doctor is None or self.roundSave is not None)
+            and (self.detective is None or self.roundDetect is not None)
+        ):
+            self.summariseRound()
+
+    def summariseRound(self):
+        saved = (
+            not self.roundKillSkip
+            and self.roundKill is not None
+            and self.roundSave == self.roundKill
+        )
+        kill = not self.roundKillSkip and self.roundKill is not None and not saved
+
+        if self.detective is not None and self.roundDetect is not None:
+            found = self.roles.get(self.roundDetect) is Role.MAFIA
+        else:
+            found = None
+
+        self.emit(
+            Event.NIGHT_SUMMARY,
+            skipped=bool(self.roundKillSkip),
+            target=self.roundKill,
+            saved=saved,
+            doctorAlive=self.doctor is not None,
+            detective=self.detective,
+            detected=self.roundDetect,
+            found=found,
+        )
+
+        # move on before killing anyone, so the kill can't resolve the night a second time
+        self.state = State.ROUNDPURGE
+
+        if kill:
+            self.kill(self.roundKill)
+            win = self.checkWinConditions()
+
+            if win:
+                self.endGame(win)
+
+        if self.state != State.END:
+            self.roundPurge = Tally(self.players)
+            self.emit(
+                Event.PURGE_STARTED,
+                skipped=bool(self.roundKillSkip),
+                saved=saved,
+                players=list(self.players),
+            )
+
+    def testPurge(self):
+        # a majority settles the vote early, otherwise it's decided once everyone has had their say
+        if (
+            self.state == State.ROUNDPURGE
+            and self.roundPurge.votes
+            and (self.roundPurge.hasMajority() or self.roundPurge.complete)
+        ):
+            self.purge()
+
+    def purge(self):
+        chosen, count = self.roundPurge.leader, self.roundPurge.lead
+        if chosen is not False and count >= (math.ceil(len(self.roundPurge) / 2)):
+            self.emit(Event.PURGE_AGREED, target=chosen)
+            self.kill(chosen, True)
+            win = self.checkWinConditions()
+
+            if win:
+                self.endGame(win)
+            else:
+                self.continueGame()
+
+        else:
+            self.emit(Event.PURGE_NO_AGREEMENT)
+            self.continueGame()
@@ -1,770 +1,1028 @@
-import math
 import random
-from enum import Enum
-from collections import Counter
-import asyncio
+import time
 
 import discord
 
+from gamebot.coalescer import Coalescer
 from gamebot.helpers import parseMessage, userInActiveGame, isDM, Colours
+from gamebot.logs import context
+from gamebot.fanout import FanOut
+from gamebot.router import Router
+from gamebot.status import StatusMessage
+from gamebot.templates import Templates
+from gamebot.worker import Worker
+from mafia.engine import Engine, Event, Role, State, Win
+from mafia.strings import strings
 
 commands = ["join", "leave", "start", "choose", "purge", "why", "who"]
 
 
-class State(Enum):
-    START = 1
-    ROUNDSLEEP = 2
-    ROUNDPURGE = 3
-    END = 4
-
+class Game:
+    # Discord adapter for the rules in mafia.engine, turns commands into engine actions and renders the events
+    # players are tracked by user ID, member objects are only looked up when rendering
+    # commands are handled one at a time off the actions queue and never wait on Discord, everything they send goes
+    # through the outbox in order, and anything that needs a reply from Discord first queues a follow up action
+
+    __slots__ = (
+        "actions",
+        "outbox",
+        "messages",
+        "status",
+        "bot",
+        "guild",
+        "channel",
+        "prefix",
+        "text",
+        "engine",
+        "mafiaChannel",
+        "members",
+        "names",
+        "phase",
+        "log",
+        "started",
+    )
+
+    minPlayers = Engine.minPlayers
+    maxPlayers = Engine.maxPlayers
+
+    # how many DMs/channel messages are sent at once when messaging players
+    fanoutLimit = 5
+
+    # seconds that chatty updates (joins, votes, choices) are held for so they can go out as one message
+    coalesceWindow = 1
+
+    # the status message is edited at most once every this many seconds
+    statusWindow = 2
+
+    # used unless the guild has set its own, see mafia.strings
+    locale = "en"
+
+    # seconds a night or day can run before it's settled with the choices made so far, and how long a game can sit
+    # waiting to start or restart before it's closed - guilds can override these with the timeout setting
+    timeouts = {"night": 5 * 60, "day": 10 * 60, "idle": 30 * 60}
+    # bumped whenever the snapshot layout changes, older snapshots are dropped rather than restored
+    snapshotVersion = 2
+
+    phases = {
+        State.START: "idle",
+        State.ROUNDSLEEP: "night",
+        State.ROUNDPURGE: "day",
+        State.END: "idle",
+    }
+
+    # commands accepted in each state, compiled into a (state, command) dispatch table
+    handlers = {
+        State.START: {
+            "join": "cJoin",
+            "leave": "cLeave",
+            "start": "cStart",
+            "why": "cWhy",
+            "who": "cWho",
+        },
+        State.ROUNDSLEEP: {
+            "leave": "cLeave",
+            "choose": "cChoose",
+            "why": "cWhy",
+            "who": "cWho",
+        },
+        State.ROUNDPURGE: {
+            "leave": "cLeave",
+            "accuse": "cAccuse",
+            "skip": "cSkip",
+            "why": "cWhy",
+            "who": "cWho",
+        },
+        State.END: {"leave": "cLeave", "restart": "cRestart", "why": "cWhy"},
+    }
+
+    router = Router.compile(handlers)
+
+    # engine events and the method that renders each of them
+    renderers = {
+        Event.JOINED: "eJoined",
+        Event.LEFT: "eLeft",
+        Event.NOT_ENOUGH_PLAYERS: "eNotEnoughPlayers",
+        Event.ROLES_ALLOCATED: "eRolesAllocated",
+        Event.ROUND_STARTED: "eRoundStarted",
+        Event.CHOICE_SUBMITTED: "eChoiceSubmitted",
+        Event.CHOICE_INVALID: "eChoiceInvalid",
+        Event.SAVE_REPEATED: "eSaveRepeated",
+        Event.MARKED: "eMarked",
+        Event.NO_AGREEMENT: "eNoAgreement",
+        Event.NIGHT_SUMMARY: "eNightSummary",
+        Event.KILLED: "eKilled",
+        Event.PURGE_STARTED: "ePurgeStarted",
+        Event.ACCUSED: "eAccused",
+        Event.ACCUSE_INVALID: "eAccuseInvalid",
+        Event.NOT_IN_GAME: "eNotInGame",
+        Event.SKIPPED: "eSkipped",
+        Event.PURGE_AGREED: "ePurgeAgreed",
+        Event.PURGE_NO_AGREEMENT: "ePurgeNoAgreement",
+        Event.GAME_ENDED: "eGameEnded",
+        Event.RESTARTED: None,
+        Event.TIMED_OUT: "eTimedOut",
+        Event.FULL: "eFull",
+    }
 
-class Win(Enum):
-    VILLAGERS = 1
-    MAFIA = 2
+    # Game Object Methods
+    def __init__(self, bot, channel, engine=None, log=None):
+        # a new game unless it's carrying on from a snapshot, see restore
+        self.actions = Worker(bot.loop, bot.logException)
+        self.outbox = Worker(bot.loop, bot.logException)
+        self.messages = Coalescer(bot.timers, self.outbox, self.coalesceWindow)
+        self.bot = bot
+        self.guild = channel.guild
+        self.channel = channel
+        self.status = StatusMessage(
+            bot.timers, self.outbox, self.channel, self.statusEmbed, self.statusWindow
+        )
 
+        self.refreshSettings()
 
-class Game:
+        if engine is None:
+            # seeded so the game log can replay it exactly
+            seed = random.getrandbits(32)
+            self.engine = Engine(seed)
+            self.log = "{}-{}.jsonl".format(channel.id, int(time.time()))
+            self.record("created", seed=seed, guild=self.guild.id, channel=channel.id)
+        else:
+            self.engine = engine
+            self.log = log
+            self.record("restored", engine=engine.snapshot())
 
-    lock = None
-    bot = None
-    guild = None
-    channel = None
+        self.setInitialState()
 
-    minPlayers = 5
-    maxPlayers = 15
+        self.phase = None
+        self.started = None
+        self.schedule()
 
-    # Game Object Methods
-    def __init__(self, bot, message):
-        self.lock = asyncio.Lock()
-        self.bot = bot
-        self.guild = message.guild
-        self.channel = message.channel
+    @property
+    def settings(self):
+        # looked up each time as the bot only keeps recently used guild settings cached
+        return self.bot.settings[self.guild.id]
 
-        self.settings = self.bot.settings[self.guild.id]
-        self.prefix = self.settings["prefix"]
+    @property
+    def state(self):
+        return self.engine.state
 
-        random.seed()
+    @property
+    def players(self):
+        return self.engine.players
 
-        self.setInitialState()
+    def refreshSettings(self):
+        # called again by the bot whenever the guild's settings change
+        self.prefix = self.settings["prefix"]
+        self.text = Templates.get(
+            strings,
+            self.settings.get("locale", self.locale),
+            prefix=self.prefix,
+            minPlayers=self.minPlayers,
+            maxPlayers=self.maxPlayers,
+        )
 
     def setInitialState(self):
         self.mafiaChannel = None
-        self.players = []
-        self.villagers = []
-        self.mafia = []
-        self.doctor = None
-        self.detective = None
-        self.round = 1
-        self.mafiaChoose = {}
-        self.roundKill = None
-        self.roundKillSkip = None
-        self.roundSave = None
-        self.lastRoundSave = None
-        self.roundDetect = None
-        self.roundPurge = {}
-        self.state = State.START
+        self.members = (
+            {}
+        )  # user ID -> member, for when the guild's member cache doesn't have them
+        self.names = (
+            {}
+        )  # user ID -> display name, from a snapshot until the member is fetched again
+
+    @classmethod
+    def restore(cls, bot, channel, snapshot):
+        # carry on from a snapshot saved before the bot last stopped, None if it's from an older version
+        if snapshot.get("version") != cls.snapshotVersion:
+            return None
+
+        # reseeded, the restored record in the game log has the new seed so replays still match
+        engine = Engine.restore(snapshot["engine"], random.getrandbits(32))
+        game = cls(bot, channel, engine, snapshot["log"])
+
+        for uID in game.players:
+            game.indexPlayer(uID)
+
+        # without the members intent the cache won't have the players after a restart, they're fetched before
+        # anything else is sent and the names saved with the snapshot are used in the meantime
+        game.names = dict(snapshot.get("names", []))
+        game.outbox.submit(game.fetchMembers)
+
+        if snapshot["status"] is not None:
+            game.status.message = channel.get_partial_message(snapshot["status"])
+
+        if snapshot["mafiaChannel"] is not None:
+            game.mafiaChannel = bot.get_channel(snapshot["mafiaChannel"])
+
+            if game.mafiaChannel:
+                bot.mafiaChannels[game.mafiaChannel.id] = channel.id
+
+        if game.state in [State.ROUNDSLEEP, State.ROUNDPURGE] and not game.mafiaChannel:
+            # deleted while the bot was away, the mafia need a new one to carry on
+            game.outbox.submit(game.reopenMafiaChannel)
+
+        game.send(channel, game.text["restored"])
+        game.status.update()
+        game.schedule()
+        return game
+
+    def snapshot(self):
+        return {
+            "version": self.snapshotVersion,
+            "saved": time.time(),
+            "guild": self.guild.id,
+            "mafiaChannel": self.mafiaChannel.id if self.mafiaChannel else None,
+            "status": self.status.message.id if self.status.message else None,
+            "engine": self.engine.snapshot(),
+            "names": [[uID, self.name(uID)] for uID in self.players],
+            "log": self.log,
+        }
+
+    def save(self):
+        # only queued here, the bot writes snapshots out with its settings
+        self.bot.snapshots.save(self.channel.id, self.snapshot())
+
+    def suspend(self):
+        # stop without tidying anything up, the game carries on from its snapshot when the bot is back
+        self.bot.timers.cancel(self.channel.id)
+        self.actions.stop()
+        self.outbox.stop()
+        self.messages.stop()
+        self.status.stop()
+        self.save()
 
     async def destroy(self):
+        self.bot.timers.cancel(self.channel.id)
+        self.bot.snapshots.delete(self.channel.id)
+        self.actions.stop()
+        self.outbox.stop()
+        self.messages.stop()
+        self.status.stop()
+        self.clearPlayers()
         await self.removeMafiaChannel()
+        await self.status.close()
+
+    async def idle(self):
+        # wait until every queued action and everything it sends is done
+        while self.actions.task or self.outbox.task:
+            await self.actions.join()
+            await self.outbox.join()
 
     async def launch(self, message):
         await message.channel.send(
-            embed=discord.Embed(
-                title="Mafia :dagger:",
-                description="Welcome to the village of Upper Lowerstoft, it's normally quite a peaceful place but recently something *a bit sinister* has been happening when everyone's tucked up in bed...\n\nTo join the game message `{0}join`, then `{0}start` when there are at least {1} players. To leave the game at any point message `{0}leave`.".format(
-                    self.prefix, self.minPlayers
-                ),
-                colour=Colours.DARK_RED,
-            )
+            embed=self.text.embed("launch", Colours.DARK_RED, "launchTitle")
         )
 
-    async def on_message(self, message):
-        async with self.lock:
-            # TODO: split this into separate functions!
+    async def on_message(self, message, command=None, args=None):
+        if command is None:
             command, args = parseMessage(message, self.prefix)
 
-            if (
-                command == "join"
-                and message.channel == self.channel
-                and self.state == State.START
-            ):
-                if self.hasUser(message.author.id):
-                    await message.channel.send("You're already in the game!")
-                elif userInActiveGame(message.author.id, self.bot.active):
-                    await message.channel.send("You're already in a game elsewhere!")
-                else:
-                    try:
-                        embed = discord.Embed(
-                            description="Welcome to Upper Lowerstoft, we hope you have a peaceful visit.\n\nDuring the game I will send you messages here, if you need to leave at any point message `{}leave` in the game channel.".format(
-                                self.prefix
-                            ),
-                            colour=Colours.DARK_BLUE,
-                        )
-                        await message.author.send(embed=embed)
-
-                        self.players.append(message.author)
-                        if len(self.players) < self.minPlayers:
-                            l = "{} players of {} needed".format(
-                                len(self.players), self.minPlayers
-                            )
-                        else:
-                            l = "{} players of maximum {}".format(
-                                len(self.players), self.maxPlayers
-                            )
-                        await message.channel.send(
-                            "{} joined the game ({})".format(message.author.mention, l)
-                        )
-
-                    except discord.errors.Forbidden:
-                        await self.channel.send(
-                            "{0.mention} you have your DMs turned off - the game doesn't work if I can't send you messages :cry:".format(
-                                message.author
-                            )
-                        )
-
-            elif command == "leave" and message.channel == self.channel:
-                if message.author in self.players:
-                    await self.channel.send(
-                        "{} left the game".format(message.author.mention)
-                    )
-
-                    if self.state in [State.ROUNDSLEEP, State.ROUNDPURGE]:
-                        await self.kill(message.author)
-                        win = self.checkWinConditions()
-
-                        if win:
-                            self.endGame(win)
-
-                    else:
-                        self.players.remove(message.author)
-
-            elif (
-                command == "start"
-                and message.channel == self.channel
-                and self.state == State.START
-            ):
-                if message.author in self.players and message.channel == self.channel:
-                    if len(self.players) < self.minPlayers:
-                        await self.channel.send(
-                            "There aren't enough players ({} of {} needed)".format(
-                                len(self.players), self.minPlayers
-                            )
-                        )
-
-                    else:
-                        await self.startGame()
-
-            elif command == "choose" and self.state == State.ROUNDSLEEP:
-
-                def IDFromArg(args):
-                    if len(args) > 1:
-                        try:
-                            return int(args[1])
-                        except ValueError:
-                            return False
-
-                if (
-                    message.author in self.mafia
-                    and message.channel == self.mafiaChannel
-                ):
-                    id = IDFromArg(args)
-
-                    if not message.author.id in self.mafiaChoose and id:
-                        if (id < 1) or (id > len(self.players)):
-                            await message.channel.send(
-                                "{} - that isn't a valid choice".format(
-                                    message.author.mention
-                                )
-                            )
-                        else:
-                            self.mafiaChoose[message.author.id] = id
-                            await message.channel.send(
-                                "{} - choice submitted".format(message.author.mention)
-                            )
-
-                            if len(self.mafiaChoose) == len(self.mafia):
-                                chosen, count = Counter(
-                                    self.mafiaChoose.values()
-                                ).most_common(1)[0]
-                                if count >= (math.floor(len(self.mafia) / 2) + 1):
-                                    self.roundKill = self.players[chosen - 1]
-                                    await message.channel.send(
-                                        "{} has been marked for death".format(
-                                            self.roundKill.display_name
-                                        )
-                                    )
-                                else:
-                                    await message.channel.send(
-                                        "You couldn't come to an agreement, nobody will be killed this round"
-                                    )
-                                    self.roundKillSkip = True
-
-                elif message.author == self.doctor and isDM(message):
-                    id = IDFromArg(args)
-
-                    if id and ((id > 0) and (id <= len(self.players))):
-                        save = self.players[id - 1]
-                        if save != self.lastRoundSave:
-                            self.roundSave = save
-                            await message.channel.send(
-                                "Choice submitted - {} will be saved".format(
-                                    self.roundSave.display_name
-                                )
-                            )
-
-                        else:
-                            await message.channel.send(
-                                "You can't save the person two nights running!"
-                            )
-                    else:
-                        await message.channel.send("That isn't a valid choice!")
-
-                elif message.author == self.detective and isDM(message):
-                    id = IDFromArg(args)
-
-                    if id and ((id > 0) and (id <= len(self.players))):
-                        self.roundDetect = self.players[id - 1]
-                        await message.channel.send(
-                            "Choice submitted - {} will be investigated".format(
-                                self.roundDetect.display_name
-                            )
-                        )
-                    else:
-                        await message.channel.send("That isn't a valid choice!")
-
-                await self.testRoundContinue()
-
-            elif (
-                command == "accuse"
-                and message.channel == self.channel
-                and self.state == State.ROUNDPURGE
-            ):
-                if message.author in self.players:
-                    if message.mentions and (len(message.mentions) == 1):
-                        if message.mentions[0] in self.players:
-                            self.roundPurge[message.author.id] = message.mentions[0]
-                            left = len(self.players) - len(self.roundPurge)
-                            await message.channel.send(
-                                "{0.mention} accused {1.display_name} - {2} left to decide".format(
-                                    message.author, message.mentions[0], left
-                                )
-                            )
-
-                            if len(self.roundPurge) == len(self.players):
-                                await self.purge()
-
-                        else:
-                            await self.channel.send(
-                                "{0.mention} isn't in the game!".format(
-                                    message.mentions[0]
-                                )
-                            )
-                    else:
-                        await self.channel.send(
-                            "{0.mention} that wasn't a valid choice".format(
-                                message.author
-                            )
-                        )
-
-            elif (
-                command == "skip"
-                and message.channel == self.channel
-                and self.state == State.ROUNDPURGE
-            ):
-                if message.author in self.players:
-                    self.roundPurge[message.author.id] = False
-                    left = len(self.players) - len(self.roundPurge)
-                    await message.channel.send(
-                        "{} skipped - {} left to decide".format(
-                            message.author.mention, left
-                        )
-                    )
-
-                    if len(self.roundPurge) == len(self.players):
-                        await self.purge()
-
-            elif command == "restart" and self.state == State.END:
-                self.setInitialState()
-                await self.launch(message)
-
-            elif command == "why" and message.channel == self.channel:
-                if self.state == State.START:
-                    if len(self.players) < self.minPlayers:
-                        await self.channel.send(
-                            embed=discord.Embed(
-                                description="I'm waiting for more players to join, use `{0}join` if you want to play".format(
-                                    self.prefix
-                                ),
-                                colour=Colours.BLUE,
-                            )
-                        )
-
-                    else:
-                        await self.channel.send(
-                            embed=discord.Embed(
-                                description="I'm waiting for someone to start the game, use `{0}start` when you're ready to begin".format(
-                                    self.prefix
-                                ),
-                                colour=Colours.BLUE,
-                            )
-                        )
-
-                elif self.state == State.ROUNDSLEEP:
-                    waiting = []
-
-                    if not (self.roundKill or self.roundKillSkip):
-                        waiting.append("the Mafia")
-
-                    if self.doctor and not self.roundSave:
-                        waiting.append("the doctor")
-
-                    if self.detective and not self.roundDetect:
-                        waiting.append("the detective")
-
-                    await self.channel.send(
-                        embed=discord.Embed(
-                            description="I'm waiting for the following to make their choices: {}".format(
-                                ", ".join(waiting)
-                            ),
-                            colour=Colours.BLUE,
-                        )
-                    )
-
-                elif self.state == State.ROUNDPURGE:
-                    remaining = len(self.players) - len(self.roundPurge)
-                    players = ", ".join(
-                        [
-                            "{0.mention}".format(p)
-                            for p in self.players
-                            if p.id not in self.roundPurge
-                        ]
-                    )
-                    plural = "players" if remaining > 1 else "player"
-
-                    await self.channel.send(
-                        embed=discord.Embed(
-                            description="I'm waiting for the village to discuss - {0} {1} left to make a decision ({2})".format(
-                                remaining, plural, players
-                            ),
-                            colour=Colours.BLUE,
-                        )
-                    )
-
-                elif self.state == State.END:
-                    await self.channel.send(
-                        embed=discord.Embed(
-                            description="The game has ended, use `{0}restart` for a new game".format(
-                                self.prefix
-                            ),
-                            colour=Colours.BLUE,
-                        )
-                    )
-
-            elif command == "who" and self.state in [
-                State.START,
-                State.ROUNDSLEEP,
-                State.ROUNDPURGE,
-            ]:
-                if len(self.players) > 0:
-                    are = "are" if len(self.players) > 1 else "is"
-                    players = " ".join(["{0.mention}".format(m) for m in self.players])
-                    await self.channel.send(
-                        embed=discord.Embed(
-                            description="{} {} in the game".format(players, are),
-                            color=Colours.DARK_BLUE,
-                        )
-                    )
-
-                else:
-                    await self.channel.send(
-                        embed=discord.Embed(
-                            description="Nobody is in the game yet",
-                            color=Colours.DARK_BLUE,
-                        )
-                    )
+        self.actions.submit(self.handle, message, command, args)
 
-    # Game Helpers
-    def checkWinConditions(self):
-        if len(self.mafia) >= len(self.villagers):
-            return Win.MAFIA
-        elif len(self.mafia) == 0:
-            return Win.VILLAGERS
-        else:
-            return False
+    async def handle(self, message, command, args):
+        context(self.guild.id, self.channel.id, self.log)
+        handler = self.router.match(self.state, command)
 
-    def hasUser(self, uID):
-        count = len([u for u in self.players if u.id == uID])
-        return count > 0
+        if self.hasUser(message.author.id):
+            # kept in case the guild's member cache doesn't have them later
+            self.members[message.author.id] = message.author
 
-    def allocateRoles(self):
-        nMafia = (
-            1 if len(self.players) <= 5 else (math.floor(len(self.players) / 5) + 1)
-        )
+        if handler:
+            started = time.perf_counter()
+            await getattr(self, handler)(message, args)
+            self.schedule()
+            self.bot.metrics["handler_seconds"].observe(
+                time.perf_counter() - started, "game", command
+            )
 
-        random.shuffle(self.players)
+    def act(self, action, *args):
+        # every engine action goes through here so it's in the game log, along with what it caused
+        events = getattr(self.engine, action)(*args)
+        self.record(action, args=args, events=events)
+        return events
+
+    def record(self, action, **values):
+        self.bot.gameLog.record(self.log, action, **values)
+
+    def apply(self, events):
+        # the engine has already moved on, keep the player index in step now and leave the rendering to the outbox
+        for kind, data in events:
+            if kind == Event.JOINED:
+                self.indexPlayer(data["player"])
+            elif kind in [Event.LEFT, Event.KILLED]:
+                self.unindexPlayer(data["player"])
+            elif kind == Event.ROLES_ALLOCATED:
+                self.started = time.monotonic()
+                self.bot.metrics["game_players"].observe(len(data["players"]))
+            elif kind == Event.GAME_ENDED and self.started is not None:
+                self.bot.metrics["game_seconds"].observe(
+                    time.monotonic() - self.started
+                )
+                self.started = None
 
-        self.mafia = self.players[0:nMafia]
-        self.villagers = self.players[nMafia:]
+        if events:
+            self.outbox.submit(self.render, events)
+            self.status.update()
+            self.schedule()
+            self.save()
 
-        self.doctor = self.villagers[0]
-        self.detective = self.villagers[1] if len(self.players) > 5 else None
+    async def render(self, events):
+        # render engine events in order, a renderer returning False (e.g. no mafia channel) ends the game instead
+        context(self.guild.id, self.channel.id, self.log)
+        for kind, data in events:
+            renderer = self.renderers[kind]
 
-        random.shuffle(self.players)
+            if renderer and await getattr(self, renderer)(**data) is False:
+                self.actions.submit(self.abort)
+                return
 
-    async def makeMafiaChannel(self):
-        if not self.mafiaChannel:
-            mafiaPermissions = discord.PermissionOverwrite(
-                read_messages=True, send_messages=True
-            )
+    async def abort(self):
+        self.apply(self.act("end"))
 
-            overwrites = {
-                self.guild.default_role: discord.PermissionOverwrite(
-                    read_messages=False
-                ),
-                self.guild.me: discord.PermissionOverwrite(
-                    manage_channels=True,
-                    manage_permissions=True,
-                    read_messages=True,
-                    send_messages=True,
-                    embed_links=True,
-                ),
-            }
+    def schedule(self):
+        # restart the timer when the phase changes, a game waiting to start or restart is timed from its last command
+        phase = (self.state, self.engine.round)
 
-            for m in self.mafia:
-                overwrites[m] = mafiaPermissions
-
-            try:
-                self.mafiaChannel = await self.channel.category.create_text_channel(
-                    "the-mafia", overwrites=overwrites
-                )
-                self.bot.mafiaChannels[self.mafiaChannel.id] = self.channel.id
-                return True
+        if phase == self.phase and self.state in [State.ROUNDSLEEP, State.ROUNDPURGE]:
+            return
 
-            except discord.errors.Forbidden:
-                await self.channel.send(
-                    ":exploding_head: I can't continue because I don't have permission to create text channels in this channel category - did you remove the permission?"
-                )
-                await self.endGame()
-                return False
+        self.phase = phase
+        name = self.phases[self.state]
+        timeout = self.settings.get("timeouts", {}).get(name, self.timeouts[name])
 
-    async def removeMafiaChannel(self):
-        if self.mafiaChannel:
-            del self.bot.mafiaChannels[self.mafiaChannel.id]
-            await self.mafiaChannel.delete()
-            self.mafiaChannel = None
+        if timeout:
+            self.bot.timers.set(self.channel.id, timeout, self.expire, phase)
+        else:
+            self.bot.timers.cancel(self.channel.id)
 
-    async def removeFromMafia(self, player):
-        self.mafia.remove(player)
-        permissions = discord.PermissionOverwrite(
-            read_messages=False, send_messages=False
-        )
-        await self.mafiaChannel.set_permissions(player, overwrite=permissions)
+    def expire(self, phase):
+        if phase != self.phase:
+            return
 
-    def makePlayerListEmbed(self):
-        return discord.Embed(
-            description="\n".join(
-                [
-                    "{0} - {1}".format((n + 1), v.display_name)
-                    for n, v in enumerate(self.players)
-                ]
-            ),
-            colour=Colours.PURPLE,
-        )
+        if self.state in [State.START, State.END]:
+            self.bot.loop.create_task(
+                self.bot.closeGame(self.channel.id, self.text["idleClosed"])
+            )
+        else:
+            self.actions.submit(self.timeout, phase)
 
-    async def kill(self, player, purge=False):
-        method = "purged" if purge else "killed"
+    async def timeout(self, phase):
+        if phase == (self.state, self.engine.round):
+            self.apply(self.act("timeout"))
 
-        if player in self.mafia:
-            role = "in the **mafia**"
-            await self.removeFromMafia(player)
+    def send(self, destination, *args, **kwargs):
+        self.outbox.submit(self.messages.send, destination, *args, **kwargs)
 
-        elif player == self.doctor:
-            role = "the **doctor**"
-            self.doctor = None
-            self.villagers.remove(player)
+    # Command Handlers
+    async def cJoin(self, message, args):
+        if message.channel != self.channel:
+            return
 
-        elif player == self.detective:
-            role = "the **detective**"
-            self.detective = None
-            self.villagers.remove(player)
+        if self.hasUser(message.author.id):
+            self.send(self.channel, self.text["alreadyIn"])
+        elif (
+            userInActiveGame(message.author.id, self.bot.playerGames)
+            or self.bot.playerGames.elsewhere(message.author.id) is not None
+        ):
+            # elsewhere checks the games running on the bot's other clusters
+            self.send(self.channel, self.text["alreadyElsewhere"])
+        elif self.engine.full:
+            # turned away before they're sent the welcome
+            self.apply(self.act("join", message.author.id))
+        else:
+            # they only join once the welcome DM has got through
+            self.outbox.submit(self.welcome, message.author)
 
-        elif player in self.villagers:
-            role = "a **villager**"
-            self.villagers.remove(player)
+    async def welcome(self, author):
+        try:
+            await author.send(embed=self.text.embed("welcome", Colours.DARK_BLUE))
 
-        else:
+        except discord.errors.Forbidden:
+            await self.messages.send(
+                self.channel,
+                self.text.format("dmsOff", player=self.mention(author.id)),
+            )
             return
 
-        embed = discord.Embed(
-            title="{} has been {}!".format(player.display_name, method),
-            description="They were {}".format(role),
-            colour=Colours.DARK_RED,
-        )
-        await self.channel.send(embed=embed)
-
-        self.players.remove(player)
+        self.members[author.id] = author
+        self.actions.submit(self.join, author)
 
-        await self.testRoundContinue()
+    async def join(self, author):
+        if (
+            userInActiveGame(author.id, self.bot.playerGames)
+            in [
+                False,
+                self.channel.id,
+            ]
+            and self.bot.playerGames.elsewhere(author.id) is None
+        ):
+            self.apply(self.act("join", author.id))
 
-    # Game Flow
-    async def startGame(self):
-        self.allocateRoles()
-        created = await self.makeMafiaChannel()
+    async def cLeave(self, message, args):
+        if message.channel == self.channel:
+            self.apply(self.act("leave", message.author.id))
 
-        if created:
-            await self.sendIntros()
-            await self.startRound()
+    async def cStart(self, message, args):
+        if message.channel == self.channel:
+            if self.hasUser(message.author.id) and not self.bot.canMakeMafiaChannel(
+                self.channel
+            ):
+                self.send(self.channel, self.text["noMafiaChannel"])
+                return
 
-    async def continueGame(self):
-        self.lastRoundSave = self.roundSave
-        self.mafiaChoose = {}
-        self.roundKill = None
-        self.roundKillSkip = None
-        self.roundSave = None
-        self.roundDetect = None
-        self.roundPurge = {}
+            self.apply(self.act("start", message.author.id))
 
-        self.round += 1
-        await self.startRound()
+    async def cChoose(self, message, args):
+        def IDFromArg(args):
+            if len(args) > 1:
+                try:
+                    return int(args[1])
+                except ValueError:
+                    return False
 
-    async def endGame(self, win=False):
-        self.state = State.END
+        # the mafia choose in their channel, everyone else in DMs
+        inMafia = self.engine.roleOf(message.author.id) == Role.MAFIA
 
-        if win == Win.VILLAGERS:
-            winners = " ".join(["{0.mention}".format(m) for m in self.villagers])
-            embed = discord.Embed(
-                description="The villagers ({}) have won!\n\nMessage `{}restart` to play again".format(
-                    winners, self.prefix
-                ),
-                colour=Colours.DARK_GREEN,
-            )
+        if (inMafia and message.channel == self.mafiaChannel) or (
+            not inMafia and isDM(message)
+        ):
+            self.apply(self.act("choose", message.author.id, IDFromArg(args)))
 
-        elif win == Win.MAFIA:
-            winners = " ".join(["{0.mention}".format(m) for m in self.mafia])
-            embed = discord.Embed(
-                description="The Mafia ({}) have won!\n\nMessage `{}restart` to play again".format(
-                    winners, self.prefix
-                ),
-                colour=Colours.DARK_RED,
-            )
+    async def cAccuse(self, message, args):
+        if message.channel != self.channel:
+            return
 
+        if message.mentions and (len(message.mentions) == 1):
+            target = message.mentions[0].id
         else:
-            embed = discord.Embed(
-                description="The game has had to end for some reason :cry:\n\nMessage `{}restart` to start a new game".format(
-                    self.prefix
-                ),
-                colour=Colours.BLUE,
-            )
+            target = None
 
-        await self.removeMafiaChannel()
-        await self.channel.send(embed=embed)
+        self.apply(self.act("accuse", message.author.id, target))
 
-        if self.settings["winCommand"]:
-            await self.channel.send(
-                "{} {}".format(self.settings["winCommand"], winners)
-            )
+    async def cSkip(self, message, args):
+        if message.channel == self.channel:
+            self.apply(self.act("skip", message.author.id))
 
-    # Round Flow
-    async def startRound(self):
-        embed = discord.Embed(
-            title="Round {}".format(self.round),
-            description="As the sun sets, the villagers head to bed for an uneasy nights sleep",  # make list of these to work through as a story
-            colour=Colours.PURPLE,
+    async def cRestart(self, message, args):
+        self.clearPlayers()
+        self.apply(self.act("restart"))
+        self.outbox.submit(self.relaunch, message)
+
+    async def relaunch(self, message):
+        await self.status.close()
+        self.setInitialState()
+        await self.launch(message)
+
+    async def cWhy(self, message, args):
+        if message.channel == self.channel:
+            self.showStatus()
+
+    async def cWho(self, message, args):
+        self.showStatus()
+
+    # Event Renderers
+    async def eJoined(self, player, count):
+        self.messages.post(
+            self.channel,
+            self.text.format(
+                "joinedNeeded" if count < self.minPlayers else "joinedMaximum",
+                player=self.mention(player),
+                count=count,
+            ),
         )
-        await self.channel.send(embed=embed)
-        self.state = State.ROUNDSLEEP
-        await self.sendPrompts()
-
-    async def sendIntros(self):
-        mafia = "".join(["{0.mention} ".format(m) for m in self.mafia])
-        await self.mafiaChannel.send(
-            "{} - you are the mafia, each night you get to mark one villager for death!".format(
-                mafia
-            )
+
+    async def eFull(self, player, count):
+        self.messages.post(
+            self.channel,
+            self.text.format("full", player=self.mention(player), count=count),
         )
 
-        for v in self.villagers:
-            if v in self.mafia:
-                await v.send(
-                    "You're in the mafia, each night you get to mark one villager for death! Look for `#the-mafia` channel to make your choice."
-                )
-            elif v == self.doctor:
-                await v.send(
-                    "You're the doctor, each night you get to pick one villager to save - you can't save the same person two nights in a row"
-                )
+    async def eLeft(self, player):
+        self.messages.post(
+            self.channel, self.text.format("left", player=self.mention(player))
+        )
 
-            elif v == self.detective:
-                await v.send(
-                    "You're the detective, each night you get to pick one villager to investigate and find out if they're in the mafia"
-                )
+    async def eNotEnoughPlayers(self, count, needed):
+        await self.messages.send(
+            self.channel,
+            self.text.format("notEnoughPlayers", count=count, needed=needed),
+        )
 
-            else:
-                await v.send(
-                    "You're a villager, keep your wits about you there are mafia on the loose!"
-                )
+    async def eRolesAllocated(self, players, mafia, doctor, detective):
+        if not await self.makeMafiaChannel(mafia):
+            return False
 
-    async def sendPrompts(self):
-        mafiaPrompt = "Each reply with `{0}choose number` (e.g. `{0}choose 1`) to choose the player you wish to mark for death - you need to come to an agreement as a group, if there's no clear choice then nobody will be marked, so you may want to discuss your choice first!".format(
-            self.prefix
-        )
-        doctorPrompt = "Reply with `{0}choose number` (e.g. `{0}choose 1`) to choose the player you wish to save".format(
-            self.prefix
-        )
-        detectivePrompt = "Reply with `{0}choose number` (e.g. `{0}choose 1`) to choose the player you wish to investigate".format(
-            self.prefix
-        )
+        await self.sendIntros(players, mafia, doctor, detective)
 
-        embed = self.makePlayerListEmbed()
-        await self.mafiaChannel.send(mafiaPrompt, embed=embed)
+    async def eRoundStarted(self, round, players, doctor, detective):
+        # make list of these to work through as a story
+        embed = self.text.embed("roundStarted", Colours.PURPLE).copy()
+        embed.title = self.text.format("roundTitle", round=round)
+
+        await self.sendPrompts(
+            players,
+            doctor,
+            detective,
+            self.makeFanOut().send(self.channel, embed=embed),
+        )
 
-        if self.doctor:
-            await self.doctor.send(doctorPrompt, embed=embed)
+    async def eChoiceSubmitted(self, player, role, target=None):
+        if role == Role.MAFIA:
+            self.messages.post(
+                self.mafiaChannel,
+                self.text.format("choiceSubmittedMafia", player=self.mention(player)),
+            )
+        elif role == Role.DOCTOR:
+            await self.dm(
+                player,
+                self.text.format("choiceSubmittedDoctor", name=self.name(target)),
+            )
+        elif role == Role.DETECTIVE:
+            await self.dm(
+                player,
+                self.text.format("choiceSubmittedDetective", name=self.name(target)),
+            )
 
-        if self.detective:
-            await self.detective.send(detectivePrompt, embed=embed)
+    async def eChoiceInvalid(self, player, role):
+        if role == Role.MAFIA:
+            self.messages.post(
+                self.mafiaChannel,
+                self.text.format("choiceInvalidMafia", player=self.mention(player)),
+            )
+        else:
+            await self.dm(player, self.text["choiceInvalid"])
 
-    async def testRoundContinue(self):
-        if (
-            (self.state == State.ROUNDSLEEP)
-            and (self.roundKill or self.roundKillSkip)
-            and (not self.doctor or self.roundSave)
-            and (not self.detective or self.roundDetect)
-        ):
-            await self.summariseRound()
+    async def eSaveRepeated(self, player):
+        await self.dm(player, self.text["saveRepeated"])
 
-    async def summariseRound(self):
-        summary = discord.Embed(
-            title="Wakey wakey",
-            description="As the village wakes, it's inhabitants cautiously step outside to find out what happened during the night...",
-            colour=Colours.PURPLE,
+    async def eMarked(self, target):
+        await self.messages.send(
+            self.mafiaChannel, self.text.format("marked", name=self.name(target))
         )
 
-        if self.roundKillSkip:
+    async def eNoAgreement(self):
+        await self.messages.send(self.mafiaChannel, self.text["noAgreement"])
+
+    async def eNightSummary(
+        self, skipped, target, saved, doctorAlive, detective, detected, found
+    ):
+        fanout = self.makeFanOut()
+        summary = self.text.embed("summary", Colours.PURPLE, "summaryTitle").copy()
+
+        if skipped:
             summary.add_field(
                 name=":person_shrugging:",
-                value="The Mafia didn't choose anybody to kill this time around",
+                value=self.text["summarySkipped"],
                 inline=False,
             )
-            kill = False
 
-        elif self.roundKill:
+        elif target is not None:
             summary.add_field(
                 name=":dagger:",
-                value="The Mafia chose to kill {}".format(self.roundKill.mention),
+                value=self.text.format("summaryTarget", player=self.mention(target)),
                 inline=False,
             )
 
-            if self.roundSave == self.roundKill:
+            if saved:
                 summary.add_field(
                     name=":syringe:",
-                    value="The doctor managed to save them in time!",
+                    value=self.text["summarySaved"],
                     inline=False,
                 )
-                kill = False
 
-            elif self.doctor:
+            elif doctorAlive:
                 summary.add_field(
                     name=":skull_crossbones:",
-                    value="The doctor was unable to save them",
+                    value=self.text["summaryNotSaved"],
                     inline=False,
                 )
-                kill = True
-
-            else:
-                # the doctor has been killed
-                kill = True
 
-        if self.detective and self.roundDetect:
-            if self.roundDetect in self.mafia:
+        if found is not None:
+            if found:
                 summary.add_field(
                     name=":detective:",
-                    value="The detective found a member of the mafia",
+                    value=self.text["summaryFound"],
                     inline=False,
                 )
-                await self.detective.send(
+                fanout.send(
+                    self.member(detective),
                     embed=discord.Embed(
-                        description="Correct - {} is in the mafia!".format(
-                            self.roundDetect.display_name
+                        description=self.text.format(
+                            "detectedCorrect", name=self.name(detected)
                         ),
                         colour=Colours.DARK_RED,
-                    )
+                    ),
                 )
             else:
                 summary.add_field(
                     name=":detective:",
-                    value="The detective didn't find a member of the mafia",
+                    value=self.text["summaryNotFound"],
                     inline=False,
                 )
-                await self.detective.send(
+                fanout.send(
+                    self.member(detective),
                     embed=discord.Embed(
-                        description="Incorrect - {} is not in the mafia!".format(
-                            self.roundDetect.display_name
+                        description=self.text.format(
+                            "detectedIncorrect", name=self.name(detected)
                         ),
                         colour=Colours.DARK_GREEN,
-                    )
+                    ),
                 )
 
-        await self.channel.send(embed=summary)
-
-        if kill:
-            await self.kill(self.roundKill)
-            win = self.checkWinConditions()
+        fanout.send(self.channel, embed=summary)
+        await self.flushFanOut(fanout)
 
-            if win:
-                await self.endGame(win)
+    async def eKilled(self, player, role, purged):
+        roles = {
+            Role.MAFIA: "wasMafia",
+            Role.DOCTOR: "wasDoctor",
+            Role.DETECTIVE: "wasDetective",
+            Role.VILLAGER: "wasVillager",
+        }
 
-        if self.state != State.END:
-            await self.moveToPurge()
+        if role == Role.MAFIA:
+            await self.removeFromMafia(player)
 
-    async def moveToPurge(self):
-        self.state = State.ROUNDPURGE
+        embed = discord.Embed(
+            title=self.text.format(
+                "purgedTitle" if purged else "killedTitle", name=self.name(player)
+            ),
+            description=self.text[roles[role]],
+            colour=Colours.DARK_RED,
+        )
+        await self.messages.send(self.channel, embed=embed)
 
-        if self.roundKillSkip:
-            text = "Although the Mafia didn't strike last night, the villagers are still on edge and a village meeting is called..."
+    async def ePurgeStarted(self, skipped, saved, players):
+        if skipped:
+            text = self.text["purgeSkipped"]
 
-        elif self.roundKill == self.roundSave:
-            text = "Tensions are running high after last nights attempted murder, the villagers gather to discuss..."
+        elif saved:
+            text = self.text["purgeSaved"]
 
         else:
-            text = "Horrified at last nights murder, the villagers gather to discuss..."
-
-        left = " ".join(["{0.mention}".format(m) for m in self.players])
+            text = self.text["purgeKilled"]
 
         embed = discord.Embed(
-            description="{0}\n\nIf you're suspicious of a player mention them using `{2}accuse` to accuse them of being in the Mafia, or use `{2}skip` to stay quiet. At least half the village must accuse someone for them to be purged.\n\n{1} are still in the game".format(
-                text, left, self.prefix
+            description=self.text.format(
+                "purgeStarted", text=text, players=self.mentions(players)
             ),
             colour=Colours.DARK_ORANGE,
         )
 
-        await self.channel.send(embed=embed)
+        await self.messages.send(self.channel, embed=embed)
+
+    async def eAccused(self, player, target, left, votes):
+        self.messages.post(
+            self.channel,
+            self.text.format(
+                "accused",
+                player=self.mention(player),
+                name=self.name(target),
+                votes=self.accusations(votes),
+                left=left,
+            ),
+        )
 
-    async def purge(self):
-        chosen, count = Counter(self.roundPurge.values()).most_common(1)[0]
-        if chosen != False and count >= (math.ceil(len(self.players) / 2)):
-            await self.channel.send(
-                embed=discord.Embed(
-                    description="The village has agreed that {} should be purged".format(
-                        chosen.display_name
-                    ),
-                    colour=Colours.DARK_RED,
+    async def eAccuseInvalid(self, player):
+        self.messages.post(
+            self.channel,
+            self.text.format("accuseInvalid", player=self.mention(player)),
+        )
+
+    async def eNotInGame(self, player, target):
+        self.messages.post(
+            self.channel, self.text.format("notInGame", player=self.mention(target))
+        )
+
+    async def eSkipped(self, player, left):
+        self.messages.post(
+            self.channel,
+            self.text.format("skipped", player=self.mention(player), left=left),
+        )
+
+    async def ePurgeAgreed(self, target):
+        await self.messages.send(
+            self.channel,
+            embed=discord.Embed(
+                description=self.text.format("purgeAgreed", name=self.name(target)),
+                colour=Colours.DARK_RED,
+            ),
+        )
+
+    async def ePurgeNoAgreement(self):
+        await self.messages.send(
+            self.channel,
+            embed=self.text.embed("purgeNoAgreement", Colours.DARK_GREEN),
+        )
+
+    async def eTimedOut(self, state):
+        name = "timedOutNight" if state == State.ROUNDSLEEP else "timedOutDay"
+        await self.messages.send(
+            self.channel, embed=self.text.embed(name, Colours.DARK_ORANGE)
+        )
+
+    async def eGameEnded(self, win, winners):
+        winners = self.mentions(winners)
+
+        if win == Win.VILLAGERS:
+            embed = discord.Embed(
+                description=self.text.format("wonVillagers", players=winners),
+                colour=Colours.DARK_GREEN,
+            )
+
+        elif win == Win.MAFIA:
+            embed = discord.Embed(
+                description=self.text.format("wonMafia", players=winners),
+                colour=Colours.DARK_RED,
+            )
+
+        else:
+            embed = self.text.embed("ended", Colours.BLUE)
+
+        fanout = self.makeFanOut()
+        fanout.call(self.mafiaChannel, self.removeMafiaChannel)
+        fanout.send(self.channel, embed=embed)
+
+        if self.settings["winCommand"]:
+            fanout.send(
+                self.channel, "{} {}".format(self.settings["winCommand"], winners)
+            )
+
+        await self.flushFanOut(fanout)
+
+    # Game Helpers
+    def hasUser(self, uID):
+        return self.engine.hasPlayer(uID)
+
+    def member(self, uID):
+        # None if they can't be found, e.g. they've left the guild
+        return (
+            self.guild.get_member(uID)
+            or self.members.get(uID)
+            or self.bot.get_user(uID)
+        )
+
+    async def fetchMembers(self):
+        for uID in self.players:
+            if self.guild.get_member(uID) is None and uID not in self.members:
+                try:
+                    self.members[uID] = await self.guild.fetch_member(uID)
+                except discord.errors.HTTPException:
+                    pass
+
+    async def dm(self, uID, *args, **kwargs):
+        member = self.member(uID)
+
+        if member is not None:
+            await member.send(*args, **kwargs)
+
+    def mention(self, uID):
+        return "<@{}>".format(uID)
+
+    def name(self, uID):
+        member = self.member(uID)
+
+        if member is not None:
+            return member.display_name
+
+        return self.names.get(uID) or self.mention(uID)
+
+    def accusations(self, count):
+        return self.text.format(
+            "accusations" if count > 1 else "accusation", count=count
+        )
+
+    def mentions(self, uIDs):
+        return " ".join([self.mention(u) for u in uIDs])
+
+    def indexPlayer(self, uID):
+        self.bot.playerGames[uID] = self.channel.id
+
+    def unindexPlayer(self, uID):
+        if self.bot.playerGames.get(uID) == self.channel.id:
+            del self.bot.playerGames[uID]
+
+    def clearPlayers(self):
+        for uID in self.engine.players:
+            self.unindexPlayer(uID)
+
+    async def makeMafiaChannel(self, mafia):
+        if not self.mafiaChannel:
+            mafiaPermissions = discord.PermissionOverwrite(
+                read_messages=True, send_messages=True
+            )
+
+            overwrites = {
+                self.guild.default_role: discord.PermissionOverwrite(
+                    read_messages=False
+                ),
+                self.guild.me: discord.PermissionOverwrite(
+                    manage_channels=True,
+                    manage_permissions=True,
+                    read_messages=True,
+                    send_messages=True,
+                    embed_links=True,
+                    manage_messages=True,
+                    read_message_history=True,
+                ),
+            }
+
+            for m in mafia:
+                # anyone who can't be found has left the guild, so can't see the channel anyway
+                if self.member(m) is not None:
+                    overwrites[self.member(m)] = mafiaPermissions
+
+            try:
+                self.mafiaChannel = await self.bot.channelPool.lease(
+                    self.channel.category, overwrites
                 )
+                self.bot.mafiaChannels[self.mafiaChannel.id] = self.channel.id
+                self.save()
+
+            except discord.errors.Forbidden:
+                await self.messages.send(self.channel, self.text["noMafiaChannel"])
+                return False
+
+        return True
+
+    async def reopenMafiaChannel(self):
+        if not await self.makeMafiaChannel(self.engine.mafia):
+            self.actions.submit(self.abort)
+            return
+
+        await self.messages.send(
+            self.mafiaChannel,
+            self.text.format(
+                "introMafiaChannel", players=self.mentions(self.engine.mafia)
+            ),
+        )
+
+        if Role.MAFIA in self.engine.waitingFor():
+            await self.messages.send(
+                self.mafiaChannel,
+                self.text["promptMafia"],
+                embed=self.makePlayerListEmbed(self.players),
+            )
+
+    async def removeMafiaChannel(self):
+        if self.mafiaChannel:
+            channel, self.mafiaChannel = self.mafiaChannel, None
+            del self.bot.mafiaChannels[channel.id]
+            await self.bot.channelPool.release(channel)
+
+    async def removeFromMafia(self, player):
+        if self.mafiaChannel and self.member(player) is not None:
+            permissions = discord.PermissionOverwrite(
+                read_messages=False, send_messages=False
+            )
+            await self.mafiaChannel.set_permissions(
+                self.member(player), overwrite=permissions
+            )
+
+    def makeFanOut(self):
+        return FanOut(self.fanoutLimit)
+
+    async def flushFanOut(self, fanout):
+        await self.messages.flush()
+        failures = await fanout.flush()
+        unreachable = [k for k, e in failures if isinstance(k, discord.abc.User)]
+
+        if unreachable:
+            await self.messages.send(
+                self.channel,
+                self.text.format(
+                    "unreachable",
+                    players=" ".join(["{0.mention}".format(m) for m in unreachable]),
+                ),
+            )
+
+        for key, e in failures:
+            if not isinstance(key, discord.abc.User):
+                raise e
+
+    def makePlayerListEmbed(self, players, notes={}):
+        return discord.Embed(
+            description="\n".join(
+                [
+                    self.playerListEntry(n + 1, v, notes.get(v))
+                    for n, v in enumerate(players)
+                ]
+            ),
+            colour=Colours.PURPLE,
+        )
+
+    def playerListEntry(self, number, uID, note=None):
+        entry = self.text.format("playerListEntry", number=number, name=self.name(uID))
+        return (
+            self.text.format("playerListNote", entry=entry, note=note)
+            if note
+            else entry
+        )
+
+    def showStatus(self):
+        self.outbox.submit(self.linkStatus)
+
+    async def linkStatus(self):
+        # rather than answering with the status again, point to the status message, which is already up to date
+        message = await self.status.current()
+
+        if message is not None:
+            self.messages.post(
+                self.channel, self.text.format("statusLink", link=message.jump_url)
             )
 
-            await self.kill(chosen, True)
-            win = self.checkWinConditions()
+    def statusEmbed(self):
+        # the live summary of the game, built from the engine as it is when the edit goes out
+        titles = {
+            State.START: "statusStart",
+            State.ROUNDSLEEP: "statusNight",
+            State.ROUNDPURGE: "statusDay",
+            State.END: "statusEnd",
+        }
+
+        notes = {}
+        if self.state == State.ROUNDPURGE:
+            for target, count in self.engine.votes().items():
+                if target is not False:
+                    notes[target] = self.accusations(count)
+
+        if self.players:
+            embed = self.makePlayerListEmbed(self.players, notes)
+        else:
+            embed = self.text.embed("nobodyYet", Colours.PURPLE).copy()
 
-            if win:
-                await self.endGame(win)
+        embed.title = self.text.format(titles[self.state], round=self.engine.round)
+        embed.add_field(
+            name=self.text["statusField"], value=self.waitingText(), inline=False
+        )
+        return embed
 
+    def waitingText(self):
+        if self.state == State.START:
+            if len(self.players) < self.minPlayers:
+                return self.text["waitingPlayers"]
             else:
-                await self.continueGame()
+                return self.text["waitingStart"]
+
+        elif self.state == State.ROUNDSLEEP:
+            names = {
+                Role.MAFIA: "theMafia",
+                Role.DOCTOR: "theDoctor",
+                Role.DETECTIVE: "theDetective",
+            }
+            waiting = [self.text[names[r]] for r in self.engine.waitingFor()]
+
+            return self.text.format("waitingNight", roles=", ".join(waiting))
+
+        elif self.state == State.ROUNDPURGE:
+            waiting = self.engine.waitingFor()
+
+            return self.text.format(
+                "waitingDay",
+                count=len(waiting),
+                plural=self.text["players" if len(waiting) > 1 else "player"],
+                players=", ".join([self.mention(p) for p in waiting]),
+            )
+
         else:
-            await self.channel.send(
-                embed=discord.Embed(
-                    description="The village couldn't come to an agreement, nobody is purged today",
-                    colour=Colours.DARK_GREEN,
-                )
+            return self.text["waitingEnd"]
+
+    # Round Flow
+    async def sendIntros(self, players, mafia, doctor, detective):
+        fanout = self.makeFanOut()
+        fanout.send(
+            self.mafiaChannel,
+            self.text.format(
+                "introMafiaChannel",
+                players="".join(["{} ".format(self.mention(m)) for m in mafia]),
+            ),
+        )
+
+        for v in players:
+            if v in mafia:
+                text = self.text["introMafia"]
+            elif v == doctor:
+                text = self.text["introDoctor"]
+            elif v == detective:
+                text = self.text["introDetective"]
+            else:
+                text = self.text["introVillager"]
+
+            fanout.send(self.member(v), text)
+
+        await self.flushFanOut(fanout)
+
+    async def sendPrompts(self, players, doctor, detective, fanout=None):
+        fanout = fanout or self.makeFanOut()
+
+        embed = self.makePlayerListEmbed(players)
+        fanout.send(self.mafiaChannel, self.text["promptMafia"], embed=embed)
+
+        if doctor is not None:
+            fanout.send(self.member(doctor), self.text["promptDoctor"], embed=embed)
+
+        if detective is not None:
+            fanout.send(
+                self.member(detective), self.text["promptDetective"], embed=embed
             )
 
-            await self.continueGame()
+        await self.flushFanOut(fanout)
@@ -0,0 +1,65 @@
+import discord
+
+
+class ChannelPool:
+    # hidden mafia channels kept per category, leased to a game then recycled instead of deleted
+
+    name = "the-mafia"
+
+    # idle channels kept per category, any more are deleted when they're released
+    idleLimit = 2
+
+    def __init__(self):
+        self.idle = {}  # category ID -> [channels]
+
+    async def lease(self, category, overwrites):
+        idle = self.idle.get(category.id, [])
+
+        while idle:
+            channel = idle.pop()
+
+            try:
+                await channel.edit(overwrites=overwrites)
+                return channel
+
+            except discord.errors.NotFound:
+                # somebody deleted the channel while it was idle
+                continue
+
+        return await category.create_text_channel(self.name, overwrites=overwrites)
+
+    async def release(self, channel):
+        idle = self.idle.setdefault(channel.category_id, [])
+
+        if len(idle) >= self.idleLimit:
+            await self.discard(channel)
+            return
+
+        guild = channel.guild
+        overwrites = {
+            target: overwrite
+            for target, overwrite in channel.overwrites.items()
+            if target in (guild.default_role, guild.me)
+        }
+
+        try:
+            await channel.edit(overwrites=overwrites)
+            await channel.purge(limit=None)
+            idle.append(channel)
+
+        except discord.errors.HTTPException:
+            # can't be recycled safely (e.g. missing manage messages), so fall back to deleting it
+            await self.discard(channel)
+
+    async def discard(self, channel):
+        try:
+            await channel.delete()
+        except discord.errors.NotFound:
+            pass
+
+    async def reclaim(self):
+        idle, self.idle = self.idle, {}
+
+        for channels in idle.values():
+            for channel in channels:
+                await self.discard(channel)
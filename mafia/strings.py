@@ -0,0 +1,100 @@
+# everything the game says, by locale - {prefix} and {minPlayers}/{maxPlayers} are filled in once per guild prefix
+# by gamebot.templates, the other placeholders each time the text is used
+# a locale only needs the strings it translates, anything missing falls back to "en"
+
+strings = {
+    "en": {
+        # lobby
+        "launchTitle": "Mafia :dagger:",
+        "launch": "Welcome to the village of Upper Lowerstoft, it's normally quite a peaceful place but recently something *a bit sinister* has been happening when everyone's tucked up in bed...\n\nTo join the game message `{prefix}join`, then `{prefix}start` when there are at least {minPlayers} players. To leave the game at any point message `{prefix}leave`.",
+        "welcome": "Welcome to Upper Lowerstoft, we hope you have a peaceful visit.\n\nDuring the game I will send you messages here, if you need to leave at any point message `{prefix}leave` in the game channel.",
+        "dmsOff": "{player} you have your DMs turned off - the game doesn't work if I can't send you messages :cry:",
+        "alreadyIn": "You're already in the game!",
+        "alreadyElsewhere": "You're already in a game elsewhere!",
+        "joinedNeeded": "{player} joined the game ({count} players of {minPlayers} needed)",
+        "joinedMaximum": "{player} joined the game ({count} players of maximum {maxPlayers})",
+        "full": "Sorry {player}, the game is full ({count} players is the most it can take)",
+        "left": "{player} left the game",
+        "notEnoughPlayers": "There aren't enough players ({count} of {needed} needed)",
+        "noMafiaChannel": ":exploding_head: I can't continue because I don't have permission to create text channels in this channel category - did you remove the permission?",
+        "unreachable": "{players} I couldn't send you a message - the game doesn't work if I can't send you messages :cry:",
+        "restored": "Sorry about that, I had to restart - the game carries on from where it was",
+        "idleClosed": "Nobody has played for a while so I've closed the game, use `{prefix}mafia` to start a new one",
+        # roles
+        "introMafiaChannel": "{players} - you are the mafia, each night you get to mark one villager for death!",
+        "introMafia": "You're in the mafia, each night you get to mark one villager for death! Look for `#the-mafia` channel to make your choice.",
+        "introDoctor": "You're the doctor, each night you get to pick one villager to save - you can't save the same person two nights in a row",
+        "introDetective": "You're the detective, each night you get to pick one villager to investigate and find out if they're in the mafia",
+        "introVillager": "You're a villager, keep your wits about you there are mafia on the loose!",
+        # night
+        "roundTitle": "Round {round}",
+        "roundStarted": "As the sun sets, the villagers head to bed for an uneasy nights sleep",
+        "promptMafia": "Each reply with `{prefix}choose number` (e.g. `{prefix}choose 1`) to choose the player you wish to mark for death - you need to come to an agreement as a group, if there's no clear choice then nobody will be marked, so you may want to discuss your choice first!",
+        "promptDoctor": "Reply with `{prefix}choose number` (e.g. `{prefix}choose 1`) to choose the player you wish to save",
+        "promptDetective": "Reply with `{prefix}choose number` (e.g. `{prefix}choose 1`) to choose the player you wish to investigate",
+        "playerListEntry": "{number} - {name}",
+        "playerListNote": "{entry} ({note})",
+        "choiceSubmittedMafia": "{player} - choice submitted",
+        "choiceSubmittedDoctor": "Choice submitted - {name} will be saved",
+        "choiceSubmittedDetective": "Choice submitted - {name} will be investigated",
+        "choiceInvalidMafia": "{player} - that isn't a valid choice",
+        "choiceInvalid": "That isn't a valid choice!",
+        "saveRepeated": "You can't save the person two nights running!",
+        "marked": "{name} has been marked for death",
+        "noAgreement": "You couldn't come to an agreement, nobody will be killed this round",
+        # morning
+        "summaryTitle": "Wakey wakey",
+        "summary": "As the village wakes, it's inhabitants cautiously step outside to find out what happened during the night...",
+        "summarySkipped": "The Mafia didn't choose anybody to kill this time around",
+        "summaryTarget": "The Mafia chose to kill {player}",
+        "summarySaved": "The doctor managed to save them in time!",
+        "summaryNotSaved": "The doctor was unable to save them",
+        "summaryFound": "The detective found a member of the mafia",
+        "summaryNotFound": "The detective didn't find a member of the mafia",
+        "detectedCorrect": "Correct - {name} is in the mafia!",
+        "detectedIncorrect": "Incorrect - {name} is not in the mafia!",
+        "killedTitle": "{name} has been killed!",
+        "purgedTitle": "{name} has been purged!",
+        "wasMafia": "They were in the **mafia**",
+        "wasDoctor": "They were the **doctor**",
+        "wasDetective": "They were the **detective**",
+        "wasVillager": "They were a **villager**",
+        # day
+        "purgeSkipped": "Although the Mafia didn't strike last night, the villagers are still on edge and a village meeting is called...",
+        "purgeSaved": "Tensions are running high after last nights attempted murder, the villagers gather to discuss...",
+        "purgeKilled": "Horrified at last nights murder, the villagers gather to discuss...",
+        "purgeStarted": "{text}\n\nIf you're suspicious of a player mention them using `{prefix}accuse` to accuse them of being in the Mafia, or use `{prefix}skip` to stay quiet. At least half the village must accuse someone for them to be purged.\n\n{players} are still in the game",
+        "accused": "{player} accused {name} ({votes}) - {left} left to decide",
+        "accusation": "{count} accusation",
+        "accusations": "{count} accusations",
+        "accuseInvalid": "{player} that wasn't a valid choice",
+        "notInGame": "{player} isn't in the game!",
+        "skipped": "{player} skipped - {left} left to decide",
+        "purgeAgreed": "The village has agreed that {name} should be purged",
+        "purgeNoAgreement": "The village couldn't come to an agreement, nobody is purged today",
+        "timedOutNight": "The sun is coming up - anyone who hasn't made their choice has run out of time!",
+        "timedOutDay": "Time's up - the village has to decide with the accusations made so far!",
+        # end
+        "wonVillagers": "The villagers ({players}) have won!\n\nMessage `{prefix}restart` to play again",
+        "wonMafia": "The Mafia ({players}) have won!\n\nMessage `{prefix}restart` to play again",
+        "ended": "The game has had to end for some reason :cry:\n\nMessage `{prefix}restart` to start a new game",
+        # status
+        "statusStart": "Mafia :dagger:",
+        "statusNight": "Round {round} - night",
+        "statusDay": "Round {round} - day",
+        "statusEnd": "Mafia :dagger: - game over",
+        "statusField": "Status",
+        "statusLink": "The game's status is kept up to date here: {link}",
+        "nobodyYet": "Nobody is in the game yet",
+        "waitingPlayers": "I'm waiting for more players to join, use `{prefix}join` if you want to play",
+        "waitingStart": "I'm waiting for someone to start the game, use `{prefix}start` when you're ready to begin",
+        "waitingNight": "I'm waiting for the following to make their choices: {roles}",
+        "waitingDay": "I'm waiting for the village to discuss - {count} {plural} left to make a decision ({players})",
+        "waitingEnd": "The game has ended, use `{prefix}restart` for a new game",
+        "theMafia": "the Mafia",
+        "theDoctor": "the doctor",
+        "theDetective": "the detective",
+        "player": "player",
+        "players": "players",
+    }
+}
@@ -0,0 +1,96 @@
+from collections import Counter
+
+
+class Tally:
+    # running vote counts for one decision, kept up to date as votes are cast, changed or withdrawn
+    # so the leader, who's still to vote and whether there's a majority are all known without recounting
+
+    __slots__ = ("votes", "counts", "pending", "leader")
+
+    def __init__(self, voters=()):
+        self.votes = {}  # voter -> choice
+        self.counts = Counter()
+        self.pending = set(voters)
+        self.leader = None
+
+    def __len__(self):
+        # everyone who can vote, whether they have yet or not
+        return len(self.votes) + len(self.pending)
+
+    @property
+    def complete(self):
+        return not self.pending
+
+    @property
+    def lead(self):
+        return self.counts[self.leader]
+
+    def hasVoted(self, voter):
+        return voter in self.votes
+
+    def hasMajority(self):
+        # more than half of everyone who can vote agrees, so nothing still to come can change the outcome
+        return self.lead * 2 > len(self)
+
+    def hasMajorityOfVotes(self):
+        # more than half of the votes cast so far agree
+        return self.lead * 2 > len(self.votes)
+
+    def vote(self, voter, choice):
+        if voter in self.votes:
+            self.unvote(voter)
+        else:
+            self.pending.discard(voter)
+
+        self.votes[voter] = choice
+        self.counts[choice] += 1
+
+        if self.leader is None or self.counts[choice] > self.counts[self.leader]:
+            self.leader = choice
+
+    def remove(self, voter):
+        # the voter has gone, along with their vote
+        self.pending.discard(voter)
+
+        if voter in self.votes:
+            self.unvote(voter)
+            del self.votes[voter]
+
+    def withdraw(self, choice):
+        # the choice isn't available any more, everyone who picked it needs to vote again
+        for voter in [v for v, c in self.votes.items() if c == choice]:
+            self.unvote(voter)
+            del self.votes[voter]
+            self.pending.add(voter)
+
+    def unvote(self, voter):
+        choice = self.votes[voter]
+        self.counts[choice] -= 1
+
+        if not self.counts[choice]:
+            del self.counts[choice]
+
+        if choice == self.leader:
+            self.leader = (
+                max(self.counts, key=self.counts.__getitem__) if self.counts else None
+            )
+
+    def snapshot(self):
+        return {
+            "votes": [[voter, choice] for voter, choice in self.votes.items()],
+            "pending": sorted(self.pending),
+            "leader": self.leader,
+        }
+
+    @classmethod
+    def restore(cls, snapshot):
+        tally = cls(snapshot["pending"])
+
+        for voter, choice in snapshot["votes"]:
+            tally.vote(voter, choice)
+
+        # ties go to whoever got there first, which replaying the votes can't always tell
+        if snapshot["leader"] in tally.counts:
+            tally.leader = snapshot["leader"]
+
+        return tally
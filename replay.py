@@ -0,0 +1,114 @@
+#!/usr/bin/python3
+# replays game logs (written by the bot, see gamebot.gamelog) against mafia.engine, checking every logged action still
+# causes the events it did at the time - to reproduce a game that went wrong, or as a benchmark over a pile of logs
+#   python3 replay.py games/1234-1600000000.jsonl --verbose
+#   python3 replay.py games --repeat 10
+import argparse
+import json
+import os
+import time
+from enum import Enum
+
+from mafia.engine import Engine
+from gamebot.gamelog import GameLog
+
+
+class Divergence(Exception):
+    pass
+
+
+def normalise(events):
+    # the same as the log has them, enums by name and tuples as lists
+    return json.loads(
+        json.dumps(events, default=lambda v: v.name if isinstance(v, Enum) else v)
+    )
+
+
+def findLogs(paths):
+    logs = []
+
+    for path in paths:
+        if os.path.isdir(path):
+            logs += sorted(
+                os.path.join(path, name)
+                for name in os.listdir(path)
+                if name.endswith(".jsonl")
+            )
+        else:
+            logs.append(path)
+
+    return logs
+
+
+def replay(records, verbose=False):
+    # returns the engine as it was at the end of the log, and how many actions it took to get there
+    engine = None
+    actions = 0
+    started = records[0]["t"] if records else 0
+
+    for n, record in enumerate(records):
+        action = record["action"]
+
+        if action == "created":
+            engine = Engine(record["seed"])
+        elif action == "restored":
+            engine = Engine.restore(record["engine"])
+        else:
+            events = normalise(getattr(engine, action)(*record["args"]))
+            actions += 1
+
+            if events != record["events"]:
+                raise Divergence(
+                    "line {}: {}{} caused {} but the log has {}".format(
+                        n + 1, action, tuple(record["args"]), events, record["events"]
+                    )
+                )
+
+        if verbose:
+            print(
+                "{:9.3f}s {}{} {}".format(
+                    record["t"] - started,
+                    action,
+                    tuple(record.get("args", ())),
+                    " ".join(kind for kind, data in record.get("events", [])),
+                )
+            )
+
+    return engine, actions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay Mafia game logs")
+    parser.add_argument("paths", nargs="+", help="game logs, or directories of them")
+    parser.add_argument(
+        "--repeat", type=int, default=1, help="replay each log this many times"
+    )
+    parser.add_argument("--verbose", action="store_true", help="print every action")
+    options = parser.parse_args()
+
+    logs = [(path, GameLog.read(path)) for path in findLogs(options.paths)]
+    diverged = []
+    actions = 0
+
+    started = time.perf_counter()
+
+    for n in range(options.repeat):
+        for path, records in logs:
+            try:
+                engine, count = replay(records, options.verbose and n == 0)
+                actions += count
+
+            except Divergence as e:
+                if n == 0:
+                    diverged.append((path, e))
+
+    elapsed = time.perf_counter() - started
+
+    print(
+        "{} games, {} actions replayed in {:.2f}s - {:.0f} actions/s".format(
+            len(logs), actions, elapsed, actions / elapsed if elapsed else 0
+        )
+    )
+
+    for path, e in diverged:
+        print("{} diverged at {}".format(path, e))
@@ -0,0 +1,98 @@
+#!/usr/bin/python3
+# plays games against mafia.engine with random players, to tune the rules and benchmark them without Discord
+import argparse
+import random
+import time
+
+from mafia.engine import Engine, Role, State, Win
+
+
+def playGame(engine, players, rng, skipChance):
+    for p in range(players):
+        engine.join(p)
+
+    engine.start(0)
+
+    while engine.state not in [State.START, State.END]:
+        if engine.state == State.ROUNDSLEEP:
+            # the mafia agree on a random villager, the doctor and detective pick anyone
+            seats = len(engine.players)
+            targets = [
+                n + 1
+                for n, p in enumerate(engine.players)
+                if engine.roleOf(p) != Role.MAFIA
+            ]
+            target = rng.choice(targets)
+
+            for m in list(engine.mafia):
+                engine.choose(m, target)
+
+            for p in [engine.doctor, engine.detective]:
+                while p is not None and engine.state == State.ROUNDSLEEP:
+                    engine.choose(p, rng.randint(1, seats))
+
+                    if p != engine.doctor or engine.roundSave is not None:
+                        break
+
+        elif engine.state == State.ROUNDPURGE:
+            for p in list(engine.players):
+                if engine.state != State.ROUNDPURGE:
+                    break
+
+                if rng.random() < skipChance:
+                    engine.skip(p)
+                else:
+                    engine.accuse(p, rng.choice(engine.players))
+
+    return engine
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simulate games of Mafia")
+    parser.add_argument("--games", type=int, default=10000)
+    parser.add_argument("--players", type=int, default=Engine.minPlayers)
+    parser.add_argument(
+        "--max-players",
+        type=int,
+        default=Engine.maxPlayers,
+        help="most players a game takes, anyone past it is turned away",
+    )
+    parser.add_argument("--ratio", type=int, default=Engine.mafiaRatio)
+    parser.add_argument("--skip", type=float, default=0.2, help="chance a player skips")
+    parser.add_argument("--seed", type=int, default=None)
+    options = parser.parse_args()
+
+    Engine.mafiaRatio = options.ratio
+    Engine.maxPlayers = options.max_players
+    seated = min(options.players, options.max_players)
+    rng = random.Random(options.seed)
+    wins = {Win.MAFIA: 0, Win.VILLAGERS: 0}
+    rounds = 0
+
+    started = time.perf_counter()
+
+    for n in range(options.games):
+        engine = playGame(
+            Engine(rng.getrandbits(32)), options.players, rng, options.skip
+        )
+        wins[engine.checkWinConditions()] += 1
+        rounds += engine.round
+
+    elapsed = time.perf_counter() - started
+
+    print(
+        "{} games of {} players (1 mafia per {}) in {:.2f}s - {:.0f} games/s".format(
+            options.games,
+            seated,
+            options.ratio,
+            elapsed,
+            options.games / elapsed,
+        )
+    )
+    print(
+        "Mafia won {:.1%}, villagers won {:.1%}, {:.2f} rounds per game".format(
+            wins[Win.MAFIA] / options.games,
+            wins[Win.VILLAGERS] / options.games,
+            rounds / options.games,
+        )
+    )